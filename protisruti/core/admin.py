@@ -1,8 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import HttpResponseRedirect
 from django.utils.translation import gettext_lazy as _
 
-from .models import User, UserProfile, CounselorProfile
+from .forms import VersionedModelForm
+from .models import ConcurrentUpdateError, CounselorAssignment, User, UserProfile, CounselorProfile
+from .paginators import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow to millions of rows: estimated
+    page counts and no second, unfiltered COUNT(*) next to a search.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
 
 class UserProfileInline(admin.StackedInline):
@@ -17,9 +30,11 @@ class CounselorProfileInline(admin.StackedInline):
     verbose_name_plural = 'Counselor Profile'
 
 
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(LargeTableAdmin, BaseUserAdmin):
     list_display = ('email', 'user_type', 'is_active', 'date_joined')
-    search_fields = ('email', 'user_type')
+    list_filter = ('user_type', 'is_active', 'is_staff')
+    # Prefix match, served by the case-insensitive email index
+    search_fields = ('^email',)
     readonly_fields = ('date_joined',)
     ordering = ('-date_joined',)
     fieldsets = (
@@ -48,18 +63,22 @@ class CustomUserAdmin(BaseUserAdmin):
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('full_name', 'user', 'gender', 'age', 'created_at')
-    search_fields = ('full_name', 'user__email')
+    list_select_related = ('user',)
+    search_fields = ('^full_name', '^user__email')
     list_filter = ('gender', 'created_at')
+    raw_id_fields = ('user',)
 
 
 @admin.register(CounselorProfile)
-class CounselorProfileAdmin(admin.ModelAdmin):
+class CounselorProfileAdmin(LargeTableAdmin):
     list_display = ('full_name', 'user', 'specialization',
                     'experience_years', 'verification_status')
+    list_select_related = ('user',)
     list_filter = ('specialization', 'verification_status', 'created_at')
-    search_fields = ('full_name', 'user__email', 'qualification')
+    search_fields = ('^full_name', '^user__email')
+    raw_id_fields = ('user',)
     actions = ['mark_as_verified', 'mark_as_rejected']
 
     def mark_as_verified(self, request, queryset):
@@ -71,5 +90,25 @@ class CounselorProfileAdmin(admin.ModelAdmin):
     mark_as_rejected.short_description = "Mark selected counselors as rejected"
 
 
+@admin.register(CounselorAssignment)
+class CounselorAssignmentAdmin(LargeTableAdmin):
+    list_display = ('user', 'counselor', 'status', 'assigned_date', 'last_session')
+    list_select_related = ('user', 'counselor')
+    search_fields = ('^user__email', '^counselor__email')
+    list_filter = ('status', 'assigned_date')
+    autocomplete_fields = ('user', 'counselor')
+    readonly_fields = ('version',)
+    form = VersionedModelForm
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        # The form catches edits on top of an older version; this catches a
+        # change committed between the form's check and the UPDATE
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConcurrentUpdateError:
+            self.message_user(request, VersionedModelForm.stale_message, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+
 # Register the User model with the custom admin
 admin.site.register(User, CustomUserAdmin)
@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import (
+    CounselingSession,
+    CounselorStats,
+    DirtySessionDay,
+    Message,
+    MetricRollup,
+    RollupWatermark,
+    User,
+)
+
+TRUNCATE = {'hour': TruncHour, 'day': TruncDay}
+
+# Append-only sources: rows are counted once, in id order, into the bucket
+# of their timestamp column.
+APPEND_ONLY_SOURCES = {
+    'registrations': (User, 'date_joined'),
+    'messages': (Message, 'timestamp'),
+}
+
+SESSION_STATUS_METRICS = {
+    'completed': 'sessions_completed',
+    'missed': 'sessions_missed',
+    'cancelled': 'sessions_cancelled',
+}
+SESSION_MINUTES_METRIC = 'session_minutes_completed'
+
+
+def _add_to_bucket(metric, granularity, bucket, amount):
+    updated = MetricRollup.objects.filter(
+        metric=metric, granularity=granularity, bucket=bucket
+    ).update(value=F('value') + amount)
+    if not updated:
+        MetricRollup.objects.create(
+            metric=metric, granularity=granularity, bucket=bucket, value=amount)
+
+
+def rollup_append_only(metric, batch_size=50000):
+    """Aggregate rows added since the watermark into hourly and daily buckets"""
+    model, time_field = APPEND_ONLY_SOURCES[metric]
+    processed = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(source=metric)
+            upper = model.objects.filter(pk__gt=watermark.last_id).order_by('pk').values_list(
+                'pk', flat=True)[batch_size - 1:batch_size].first()
+            new_rows = model.objects.filter(pk__gt=watermark.last_id)
+            if upper is not None:
+                new_rows = new_rows.filter(pk__lte=upper)
+
+            last_id = new_rows.aggregate(last=Max('pk'))['last']
+            if last_id is None:
+                break
+
+            for granularity, trunc in TRUNCATE.items():
+                buckets = new_rows.annotate(bucket=trunc(time_field)).values('bucket').annotate(
+                    n=Count('pk')).order_by()
+                for row in buckets:
+                    _add_to_bucket(metric, granularity, row['bucket'], row['n'])
+
+            processed += new_rows.count()
+            watermark.last_id = last_id
+            watermark.save(update_fields=['last_id'])
+        if upper is None:
+            break
+    return processed
+
+
+def rollup_sessions():
+    """
+    Sessions change status after creation, so instead of adding deltas the
+    daily buckets (by scheduled day) touched since the last run are
+    recomputed from scratch: the days of sessions updated since then, plus
+    the days sessions were moved away from or deleted on (DirtySessionDay).
+    Each recomputation scans a single day.
+    """
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(source='sessions')
+        changed = CounselingSession.objects.all()
+        if watermark.last_updated_at:
+            changed = changed.filter(updated_at__gt=watermark.last_updated_at)
+
+        latest = changed.aggregate(latest=Max('updated_at'))['latest']
+        last_dirty = DirtySessionDay.objects.aggregate(last=Max('pk'))['last']
+        if latest is None and last_dirty is None:
+            return 0
+
+        days = set()
+        if latest is not None:
+            days.update(changed.annotate(
+                day=TruncDay('scheduled_time')).values_list('day', flat=True))
+        dirty = DirtySessionDay.objects.filter(pk__lte=last_dirty or 0)
+        days.update(dirty.annotate(day=TruncDay('scheduled_time')).values_list('day', flat=True))
+        metrics = list(SESSION_STATUS_METRICS.values()) + [SESSION_MINUTES_METRIC]
+        for day in days:
+            sessions = CounselingSession.objects.filter(
+                scheduled_time__gte=day, scheduled_time__lt=day + timedelta(days=1))
+            values = dict.fromkeys(metrics, 0)
+            for row in sessions.values('status').annotate(
+                    n=Count('pk'), minutes=Sum('duration_minutes')).order_by():
+                if row['status'] in SESSION_STATUS_METRICS:
+                    values[SESSION_STATUS_METRICS[row['status']]] = row['n']
+                if row['status'] == 'completed':
+                    values[SESSION_MINUTES_METRIC] = row['minutes'] or 0
+            for metric, value in values.items():
+                MetricRollup.objects.update_or_create(
+                    metric=metric, granularity='day', bucket=day, defaults={'value': value})
+
+        dirty.delete()
+        if latest is not None:
+            watermark.last_updated_at = latest
+            watermark.save(update_fields=['last_updated_at'])
+    return len(days)
+
+
+def run_rollups():
+    return {
+        'registrations': rollup_append_only('registrations'),
+        'messages': rollup_append_only('messages'),
+        'session_days': rollup_sessions(),
+    }
+
+
+def daily_series(metric, days):
+    """Daily values for the last `days` days, zero-filled, oldest first"""
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days - 1)
+    stored = dict(MetricRollup.objects.filter(
+        metric=metric, granularity='day', bucket__gte=start
+    ).values_list('bucket', 'value'))
+    return [(start + timedelta(days=i), stored.get(start + timedelta(days=i), 0))
+            for i in range(days)]
+
+
+def weekly_series(metric, weeks):
+    """Weekly (Monday-based) sums of a daily metric, oldest first"""
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    totals = {start + timedelta(weeks=i): 0 for i in range(weeks)}
+    for bucket, value in MetricRollup.objects.filter(
+            metric=metric, granularity='day', bucket__gte=start
+    ).values_list('bucket', 'value'):
+        day = timezone.localtime(bucket).replace(hour=0, minute=0, second=0, microsecond=0)
+        week = day - timedelta(days=day.weekday())
+        if week in totals:
+            totals[week] += value
+    return sorted(totals.items())
+
+
+def weekly_available_minutes():
+    """Current weekly capacity of all counselors, from the stats table"""
+    return CounselorStats.objects.aggregate(
+        total=Sum('weekly_available_minutes'))['total'] or 0
@@ -0,0 +1,509 @@
+import base64
+import functools
+import hashlib
+import json
+import uuid
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_http_methods
+
+from . import messaging
+from .assignments import assignment_participants, other_participant
+from .decorators import api_login_required
+from .fields import decompress_text
+from .forms import MessageForm
+from .models import (
+    CounselingSession,
+    CounselorAssignment,
+    CounselorAvailability,
+    CounselorProfile,
+    UserProfile,
+)
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+SYNC_BATCH_SIZE = 200
+MAX_SYNC_BATCH_SIZE = 500
+MAX_OUTBOX_SIZE = 100
+
+
+class ApiField:
+    """
+    A field exposed by the API. `source` is a dotted attribute path on the
+    model instance; `select`/`prefetch` name the relations it needs so the
+    queryset can be planned from the requested fields only.
+    """
+
+    def __init__(self, source, select=None, prefetch=None, default=True):
+        self.source = source
+        self.select = select
+        self.prefetch = prefetch
+        self.default = default
+
+    def resolve(self, obj):
+        value = obj
+        for attr in self.source.split('.'):
+            if value is None:
+                return None
+            try:
+                value = getattr(value, attr)
+            except ObjectDoesNotExist:
+                return None
+        return value
+
+
+class Resource:
+    type = None
+    model = None
+    fields = {}
+
+    def __init__(self, request):
+        self.request = request
+        self.selected = self.parse_fields(request)
+
+    def parse_fields(self, request):
+        raw = request.GET.get(f'fields[{self.type}]') or request.GET.get('fields')
+        if not raw:
+            return [name for name, field in self.fields.items() if field.default]
+        requested = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in requested if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown {self.type} field(s): {', '.join(unknown)}")
+        return requested
+
+    def plan(self, queryset):
+        """Add only the joins and prefetches the selected fields need"""
+        selects = {self.fields[name].select for name in self.selected} - {None}
+        prefetches = {self.fields[name].prefetch for name in self.selected} - {None}
+        if selects:
+            queryset = queryset.select_related(*sorted(selects))
+        if prefetches:
+            queryset = queryset.prefetch_related(*sorted(prefetches))
+        return queryset
+
+    def serialize(self, obj):
+        data = {}
+        for name in self.selected:
+            target = data
+            *parents, leaf = name.split('.')
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = self.fields[name].resolve(obj)
+        return data
+
+
+class AssignmentResource(Resource):
+    type = 'assignment'
+    model = CounselorAssignment
+    fields = {
+        'id': ApiField('id'),
+        'status': ApiField('status'),
+        'assigned_date': ApiField('assigned_date'),
+        'last_session': ApiField('last_session'),
+        'notes': ApiField('notes', default=False),
+        'user.id': ApiField('user_id'),
+        'user.email': ApiField('user.email', select='user', default=False),
+        'user.full_name': ApiField(
+            'user.user_profile.full_name', select='user__user_profile'),
+        'counselor.id': ApiField('counselor_id'),
+        'counselor.email': ApiField('counselor.email', select='counselor', default=False),
+        'counselor.full_name': ApiField(
+            'counselor.counselor_profile.full_name', select='counselor__counselor_profile'),
+        'session_ids': ApiField(
+            'session_ids', prefetch='sessions', default=False),
+    }
+
+    def serialize(self, obj):
+        if 'session_ids' in self.selected:
+            obj.session_ids = [session.pk for session in obj.sessions.all()]
+        return super().serialize(obj)
+
+
+class SessionResource(Resource):
+    type = 'session'
+    model = CounselingSession
+    fields = {
+        'id': ApiField('id'),
+        'assignment_id': ApiField('assignment_id'),
+        'scheduled_time': ApiField('scheduled_time'),
+        'duration_minutes': ApiField('duration_minutes'),
+        'status': ApiField('status'),
+        'notes': ApiField('notes', default=False),
+        'updated_at': ApiField('updated_at', default=False),
+        'user.full_name': ApiField(
+            'assignment.user.user_profile.full_name',
+            select='assignment__user__user_profile', default=False),
+        'counselor.full_name': ApiField(
+            'assignment.counselor.counselor_profile.full_name',
+            select='assignment__counselor__counselor_profile', default=False),
+    }
+
+
+class AvailabilityResource(Resource):
+    type = 'availability'
+    model = CounselorAvailability
+    fields = {
+        'id': ApiField('id'),
+        'counselor_id': ApiField('counselor_id'),
+        'day': ApiField('day_name'),
+        'weekday': ApiField('day', default=False),
+        'start_time': ApiField('start_time'),
+        'end_time': ApiField('end_time'),
+        'is_available': ApiField('is_available'),
+    }
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def etag_response(request, payload):
+    """
+    Serialize payload and attach a strong ETag; answer 304 when the client
+    already holds the same representation.
+    """
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError("Invalid cursor.")
+
+
+def parse_limit(raw, default, maximum):
+    if raw is None or raw == '':
+        return default
+    try:
+        limit = min(int(raw), maximum)
+    except (TypeError, ValueError):
+        raise ApiError("limit must be an integer.")
+    if limit < 1:
+        raise ApiError("limit must be positive.")
+    return limit
+
+
+def paginate(request, resource, queryset):
+    """Keyset pagination on the primary key; cursors are opaque to clients"""
+    limit = parse_limit(request.GET.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    queryset = queryset.order_by('pk')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(pk__gt=decode_cursor(cursor))
+
+    rows = list(resource.plan(queryset)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': [resource.serialize(row) for row in rows],
+        'next_cursor': encode_cursor(rows[-1].pk) if has_more else None,
+    }
+
+
+def api_view(view_func):
+    """Convert ApiError and Http404 into JSON error responses"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as exc:
+            return error_response(str(exc), exc.status)
+        except Http404:
+            return error_response("Not found.", 404)
+    return wrapper
+
+
+def assignments_for(user):
+    if user.user_type == 'counselor':
+        return CounselorAssignment.objects.filter(counselor=user)
+    return CounselorAssignment.objects.filter(user=user)
+
+
+def sessions_for(user):
+    if user.user_type == 'counselor':
+        return CounselingSession.objects.filter(assignment__counselor=user)
+    return CounselingSession.objects.filter(assignment__user=user)
+
+
+@require_GET
+@api_login_required
+@api_view
+def user_dashboard(request):
+    """Profile, counselors and upcoming sessions of the logged in user"""
+    if request.user.user_type != 'user':
+        raise ApiError("Only available to users.", status=403)
+    profile = get_object_or_404(UserProfile, user=request.user)
+    assignments = AssignmentResource(request)
+    sessions = SessionResource(request)
+
+    payload = {
+        'profile': {
+            'full_name': profile.full_name,
+            'email': request.user.email,
+            'gender': profile.gender,
+            'age': profile.age,
+        },
+        'assignments': [
+            assignments.serialize(a) for a in assignments.plan(
+                CounselorAssignment.objects.filter(user=request.user, status='active')
+            ).order_by('-assigned_date')
+        ],
+        'upcoming_sessions': [
+            sessions.serialize(s) for s in sessions.plan(
+                CounselingSession.objects.filter(
+                    assignment__user=request.user,
+                    status='scheduled',
+                    scheduled_time__gte=timezone.now(),
+                )
+            ).order_by('scheduled_time')[:5]
+        ],
+    }
+    return etag_response(request, payload)
+
+
+@require_GET
+@api_login_required
+@api_view
+def counselor_dashboard(request):
+    """Profile, active assignments, upcoming sessions and availability of a counselor"""
+    if request.user.user_type != 'counselor':
+        raise ApiError("Only available to counselors.", status=403)
+    profile = get_object_or_404(CounselorProfile, user=request.user)
+    assignments = AssignmentResource(request)
+    sessions = SessionResource(request)
+    availabilities = AvailabilityResource(request)
+
+    payload = {
+        'profile': {
+            'full_name': profile.full_name,
+            'email': request.user.email,
+            'specialization': profile.specialization,
+            'experience_years': profile.experience_years,
+            'verification_status': profile.verification_status,
+        },
+        'assignments': [
+            assignments.serialize(a) for a in assignments.plan(
+                CounselorAssignment.objects.filter(counselor=request.user, status='active')
+            )
+        ],
+        'upcoming_sessions': [
+            sessions.serialize(s) for s in sessions.plan(
+                CounselingSession.objects.filter(
+                    assignment__counselor=request.user,
+                    status='scheduled',
+                    scheduled_time__gte=timezone.now(),
+                )
+            ).order_by('scheduled_time')[:5]
+        ],
+        'availabilities': [
+            availabilities.serialize(a) for a in availabilities.plan(
+                CounselorAvailability.objects.filter(counselor=request.user)
+            ).order_by('day', 'start_time')
+        ],
+    }
+    return etag_response(request, payload)
+
+
+@require_GET
+@api_login_required
+@api_view
+def assignment_list(request):
+    """Assignments of the logged in user or counselor"""
+    queryset = assignments_for(request.user)
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+    return etag_response(request, paginate(request, AssignmentResource(request), queryset))
+
+
+@require_GET
+@api_login_required
+@api_view
+def assignment_detail(request, assignment_id):
+    """A single assignment visible to the logged in user or counselor"""
+    resource = AssignmentResource(request)
+    assignment = get_object_or_404(
+        resource.plan(assignments_for(request.user)), pk=assignment_id)
+    return etag_response(request, resource.serialize(assignment))
+
+
+@require_GET
+@api_login_required
+@api_view
+def session_list(request):
+    """Sessions of the logged in user or counselor"""
+    queryset = sessions_for(request.user)
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+    if request.GET.get('assignment', '').isdigit():
+        queryset = queryset.filter(assignment_id=request.GET['assignment'])
+    if request.GET.get('upcoming') == '1':
+        queryset = queryset.filter(scheduled_time__gte=timezone.now())
+    return etag_response(request, paginate(request, SessionResource(request), queryset))
+
+
+@require_GET
+@api_login_required
+@api_view
+def availability_list(request):
+    """
+    Availability of the logged in counselor, or of a given counselor
+    (?counselor=<id>) the logged in user is assigned to
+    """
+    if request.user.user_type == 'counselor':
+        counselor_id = request.user.pk
+    else:
+        counselor_id = request.GET.get('counselor', '')
+        if not counselor_id.isdigit() or not assignments_for(request.user).filter(
+                counselor_id=counselor_id).exists():
+            raise ApiError("Unknown counselor.", status=404)
+    queryset = CounselorAvailability.objects.filter(counselor_id=counselor_id)
+    return etag_response(request, paginate(request, AvailabilityResource(request), queryset))
+
+
+def sync_request(request):
+    """Sync parameters from the query string (GET) or a JSON body (POST)"""
+    if request.method == 'GET':
+        return {'cursor': request.GET.get('cursor'), 'limit': request.GET.get('limit')}
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError("Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise ApiError("Request body must be a JSON object.")
+    return body
+
+
+def conversation_partner(user, assignment_id):
+    """(participants, partner id) of a conversation of `user`, ApiError otherwise"""
+    participants = (assignment_participants(assignment_id)
+                    if str(assignment_id).isdigit() else None)
+    partner_id = participants and other_participant(participants, user.pk)
+    if not partner_id:
+        raise ApiError(f"Unknown conversation {assignment_id}.", status=404)
+    return participants, partner_id
+
+
+def send_outbox(user, outbox):
+    """Store the queued messages of a client; returns (sent, rejected)"""
+    if not isinstance(outbox, list):
+        raise ApiError("outbox must be a list.")
+    if len(outbox) > MAX_OUTBOX_SIZE:
+        raise ApiError(f"outbox takes at most {MAX_OUTBOX_SIZE} messages.")
+    sent, rejected = [], []
+    for entry in outbox:
+        # Entry errors are reported per entry: the ones before it are stored
+        # already and the client needs their ids
+        if not isinstance(entry, dict):
+            rejected.append({'client_id': None, 'error': "outbox entries must be objects."})
+            continue
+        try:
+            client_id = uuid.UUID(str(entry.get('client_id')))
+        except ValueError:
+            rejected.append({'client_id': entry.get('client_id'),
+                             'error': "client_id must be a UUID."})
+            continue
+        try:
+            participants, partner_id = conversation_partner(user, entry.get('assignment_id'))
+        except ApiError as exc:
+            rejected.append({'client_id': client_id, 'error': str(exc)})
+            continue
+        if not participants.active:
+            rejected.append({'client_id': client_id,
+                             'error': "This assignment is no longer active."})
+            continue
+        form = MessageForm({'content': entry.get('content')})
+        if not form.is_valid():
+            rejected.append({'client_id': client_id,
+                             'error': ' '.join(form.errors.get('content', []))})
+            continue
+        message, created = messaging.send_message(
+            user, partner_id, form.cleaned_data['content'], client_id)
+        sent.append({'client_id': client_id, 'id': message.pk,
+                     'timestamp': message.timestamp, 'duplicate': not created})
+    return sent, rejected
+
+
+@require_http_methods(['GET', 'POST'])
+@gzip_page
+@api_login_required
+@api_view
+def sync(request):
+    """
+    Offline sync across every conversation of the logged in user.
+
+    Returns the messages newer than `cursor` (all of them when it is left
+    out), at most `limit` per call, grouped by assignment as rows of
+    `fields`; repeat with the returned cursor while `has_more` is true.
+    POST takes the same parameters as a JSON object, plus `cursors`
+    ({assignment id: cursor}) for conversations the client holds more or
+    less of than the rest, and an `outbox` of messages to send, each
+    {client_id, assignment_id, content}. Sending is idempotent per
+    client_id, so an outbox whose response was lost can simply be sent
+    again. Sent messages come back in the same response's delta.
+    """
+    params = sync_request(request)
+    limit = parse_limit(params.get('limit'), SYNC_BATCH_SIZE, MAX_SYNC_BATCH_SIZE)
+    since = decode_cursor(params['cursor']) if params.get('cursor') else 0
+
+    cursors = params.get('cursors') or {}
+    if not isinstance(cursors, dict):
+        raise ApiError("cursors must be an object.")
+    since_by_partner = {}
+    for assignment_id, cursor in cursors.items():
+        _, partner_id = conversation_partner(request.user, assignment_id)
+        since_by_partner[partner_id] = decode_cursor(str(cursor))
+
+    sent, rejected = send_outbox(request.user, params.get('outbox') or [])
+
+    rows, has_more = messaging.message_delta(request.user, since, since_by_partner, limit)
+    partners = messaging.conversation_partners(request.user)
+    conversations = {}
+    for message_id, sender_id, receiver_id, content, timestamp, client_id in rows:
+        partner_id = receiver_id if sender_id == request.user.pk else sender_id
+        if partner_id in partners:
+            conversations.setdefault(str(partners[partner_id]), []).append(
+                [message_id, sender_id, timestamp, decompress_text(content), client_id])
+
+    # Everything up to the last row returned is now with the client
+    last = rows[-1][0] if rows else 0
+    response = JsonResponse({
+        'fields': ['id', 'sender_id', 'timestamp', 'content', 'client_id'],
+        'conversations': conversations,
+        'cursor': encode_cursor(max(since, last)),
+        'cursors': {
+            str(assignment_id): encode_cursor(max(decode_cursor(str(cursor)), last))
+            for assignment_id, cursor in cursors.items()
+        },
+        'has_more': has_more,
+        'sent': sent,
+        'rejected': rejected,
+    }, json_dumps_params={'separators': (',', ':')})
+    response['Cache-Control'] = 'private, no-store'
+    return response
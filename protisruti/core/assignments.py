@@ -0,0 +1,161 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import ConcurrentUpdateError, CounselorAssignment
+
+UPDATE_ATTEMPTS = 3
+
+Participants = namedtuple('Participants', ['user_id', 'counselor_id', 'active'])
+
+
+class AssignmentExists(Exception):
+    """Another admin created the same active assignment at the same time"""
+
+
+def create_assignment(form):
+    """
+    Save a validated UserCounselorAssignmentForm. The form's constraint check
+    can't see an assignment committed after it ran, so the unique constraint
+    decides races.
+    """
+    try:
+        with transaction.atomic():
+            return form.save()
+    except IntegrityError:
+        raise AssignmentExists(
+            "This user was just assigned to this counselor by someone else.")
+
+
+def update_assignment(assignment_id, change, attempts=UPDATE_ATTEMPTS):
+    """
+    Read-modify-write an assignment without holding a lock. `change` edits
+    a freshly loaded copy in place and returns the names of the fields it
+    changed (or nothing to skip the write). When a concurrent save bumps the
+    version first, the step is repeated on a new copy.
+    """
+    for _ in range(attempts):
+        assignment = CounselorAssignment.objects.get(pk=assignment_id)
+        fields = change(assignment)
+        if not fields:
+            return assignment
+        try:
+            with transaction.atomic():
+                assignment.save(update_fields=fields)
+            return assignment
+        except ConcurrentUpdateError:
+            continue
+    raise ConcurrentUpdateError(
+        f"Assignment {assignment_id} kept changing; gave up after {attempts} attempts.")
+
+
+def record_completed_session(assignment_id, when):
+    """Move last_session forward to `when`; an older completion never moves it back"""
+    def advance(assignment):
+        if assignment.last_session and assignment.last_session >= when:
+            return None
+        assignment.last_session = when
+        return ['last_session']
+
+    return update_assignment(assignment_id, advance)
+
+
+# Adjacency cache of the assignment graph. Both directions of every active
+# assignment are cached: counselor -> users and user -> counselors. Saves
+# and deletes of an assignment drop the entries of both ends (see signals);
+# the timeout bounds staleness for writes that skip signals.
+
+def graph_cache_timeout():
+    return getattr(settings, 'ASSIGNMENT_GRAPH_CACHE_TIMEOUT', 300)
+
+
+def _graph_key(side, user_id):
+    return f'assignment-graph:{side}:{user_id}'
+
+
+def _neighbours(side, user_id):
+    key = _graph_key(side, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        active = CounselorAssignment.objects.filter(status='active')
+        if side == 'counselor':
+            ids = active.filter(counselor_id=user_id).values_list('user_id', flat=True)
+        else:
+            ids = active.filter(user_id=user_id).exclude(
+                counselor=None).values_list('counselor_id', flat=True)
+        ids = frozenset(ids)
+        cache.set(key, ids, graph_cache_timeout())
+    return ids
+
+
+def assigned_user_ids(counselor_id):
+    """Users with an active assignment to the counselor"""
+    return _neighbours('counselor', counselor_id)
+
+
+def assigned_counselor_ids(user_id):
+    """Counselors the user has an active assignment with"""
+    return _neighbours('user', user_id)
+
+
+def chat_partner_ids(user):
+    """Everyone `user` may exchange messages with"""
+    if user.user_type == 'counselor':
+        return assigned_user_ids(user.pk)
+    return assigned_counselor_ids(user.pk)
+
+
+def _participants_key(assignment_id):
+    return f'assignment-participants:{assignment_id}'
+
+
+def _participants(row):
+    # Unknown assignments are cached as () so repeated probes stay cheap
+    if row is None:
+        return ()
+    user_id, counselor_id, status = row
+    return Participants(user_id, counselor_id, status == 'active')
+
+
+def assignment_participants(assignment_id):
+    """
+    Participants of an assignment, or None when it doesn't exist. Served
+    from the cache, so authorizing a chat request costs at most one query.
+    """
+    key = _participants_key(assignment_id)
+    participants = cache.get(key)
+    if participants is None:
+        participants = _participants(CounselorAssignment.objects.filter(
+            pk=assignment_id).values_list('user_id', 'counselor_id', 'status').first())
+        cache.set(key, participants, graph_cache_timeout())
+    return participants or None
+
+
+async def aassignment_participants(assignment_id):
+    """Async counterpart of assignment_participants"""
+    key = _participants_key(assignment_id)
+    participants = await cache.aget(key)
+    if participants is None:
+        participants = _participants(await CounselorAssignment.objects.filter(
+            pk=assignment_id).values_list('user_id', 'counselor_id', 'status').afirst())
+        await cache.aset(key, participants, graph_cache_timeout())
+    return participants or None
+
+
+def other_participant(participants, user_id):
+    """The other end of the conversation, None if `user_id` doesn't take part"""
+    if user_id == participants.user_id:
+        return participants.counselor_id
+    if user_id == participants.counselor_id:
+        return participants.user_id
+    return None
+
+
+def invalidate_graph(counselor_ids, user_ids, assignment_ids=()):
+    keys = ([_graph_key('counselor', pk) for pk in counselor_ids if pk]
+            + [_graph_key('user', pk) for pk in user_ids if pk]
+            + [_participants_key(pk) for pk in assignment_ids if pk])
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,190 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+
+from . import assignments
+from .decorators import counselor_required, user_required
+from .forms import MessageForm
+from .messaging import CHAT_HISTORY_LIMIT, aconversation_history, send_message, update_receipts
+from .models import (
+    CounselingSession,
+    CounselorAssignment,
+    CounselorAvailability,
+    CounselorProfile,
+    User,
+    UserProfile,
+)
+
+# ASGI-native versions of the read-heavy views in views.py. Every query runs
+# through the async ORM and templates only ever see evaluated lists, so no
+# database access happens while rendering.
+
+
+async def arender(request, template_name, context):
+    """
+    Render a template from an async view. The auth and messages context
+    processors touch request.user and the session synchronously, so both are
+    resolved up front.
+    """
+    request.user = await request.auser()
+    await request.session.aitems()  # populates the session cache
+    return render(request, template_name, context)
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@login_required
+@user_required
+@cache_control(private=True, no_cache=True)
+async def user_dashboard(request):
+    """Dashboard for regular users"""
+    user = await request.auser()
+    try:
+        user_profile = await UserProfile.objects.select_related('user').prefetch_related(
+            'user__assigned_counselors__counselor__counselor_profile'
+        ).aget(user=user)
+    except UserProfile.DoesNotExist:
+        messages.error(request, "Profile not found. Please contact support.")
+        return redirect('home')
+
+    context = {
+        'user_profile': user_profile,
+    }
+    return await arender(request, 'user_dashboard.html', context)
+
+
+@login_required
+@counselor_required
+@cache_control(private=True, no_cache=True)
+async def counselor_dashboard(request):
+    """Enhanced dashboard for counselors"""
+    user = await request.auser()
+
+    # The dashboard sections are independent, so fetch them concurrently
+    counselor_profile, assignments, upcoming_sessions, availabilities = await asyncio.gather(
+        CounselorProfile.objects.filter(user=user).afirst(),
+        alist(CounselorAssignment.objects.filter(
+            counselor=user,
+            status='active'
+        ).select_related('user__user_profile')),
+        alist(CounselingSession.objects.filter(
+            assignment__counselor=user,
+            status='scheduled',
+            scheduled_time__gte=timezone.now()
+        ).order_by('scheduled_time')[:5]),
+        alist(CounselorAvailability.objects.filter(
+            counselor=user
+        ).order_by('day', 'start_time')),
+    )
+
+    if counselor_profile is None:
+        messages.error(request, "Profile not found. Please contact support.")
+        return redirect('home')
+
+    context = {
+        'counselor_profile': counselor_profile,
+        'assignments': assignments,
+        'upcoming_sessions': upcoming_sessions,
+        'availabilities': availabilities,
+    }
+    return await arender(request, 'counselor_dashboard.html', context)
+
+
+@login_required
+@counselor_required
+async def view_assignments(request):
+    """View for counselors to see their assigned users"""
+    user = await request.auser()
+    assignments = await alist(CounselorAssignment.objects.filter(
+        counselor=user
+    ).select_related('user__user_profile').order_by('-assigned_date'))
+
+    context = {
+        'assignments': assignments
+    }
+    return await arender(request, 'counselor_assignments.html', context)
+
+
+@login_required
+@counselor_required
+async def assignment_detail(request, assignment_id):
+    """View details of a specific counselor-user assignment"""
+    user = await request.auser()
+    assignment = await aget_object_or_404(
+        CounselorAssignment.objects.select_related('user__user_profile'),
+        pk=assignment_id,
+        counselor=user
+    )
+
+    now = timezone.now()
+    past_sessions, upcoming_sessions = await asyncio.gather(
+        alist(CounselingSession.objects.filter(
+            assignment=assignment,
+            scheduled_time__lt=now
+        ).order_by('-scheduled_time')),
+        alist(CounselingSession.objects.filter(
+            assignment=assignment,
+            scheduled_time__gte=now,
+            status='scheduled'
+        ).order_by('scheduled_time')),
+    )
+
+    context = {
+        'assignment': assignment,
+        'past_sessions': past_sessions,
+        'upcoming_sessions': upcoming_sessions
+    }
+    return await arender(request, 'assignment_detail.html', context)
+
+
+@login_required
+async def chat_view(request, assignment_id):
+    """Conversation between the two participants of an assignment"""
+    user = await request.auser()
+    participants = await assignments.aassignment_participants(assignment_id)
+    if participants is None:
+        raise Http404("No such conversation")
+    receiver_id = assignments.other_participant(participants, user.pk)
+    if receiver_id is None:
+        raise PermissionDenied
+
+    form = MessageForm()
+    if request.method == 'POST':
+        form = MessageForm(request.POST)
+        if not participants.active:
+            messages.error(request, "This assignment is no longer active.")
+            return redirect('chat_view', assignment_id=assignment_id)
+        if form.is_valid():
+            await sync_to_async(send_message)(user, receiver_id, form.cleaned_data['content'],
+                                              form.cleaned_data['client_id'])
+            return redirect('chat_view', assignment_id=assignment_id)
+
+    receiver = await User.objects.select_related(
+        'user_profile', 'counselor_profile').aget(pk=receiver_id)
+    history = await aconversation_history(user, receiver, limit=CHAT_HISTORY_LIMIT)
+    context = {
+        'assignment_id': assignment_id,
+        'receiver': receiver,
+        'chat_messages': history,
+        'seen_message_id': await sync_to_async(update_receipts)(
+            assignment_id, user.pk, receiver_id, history),
+        'form': form,
+        'can_send': participants.active,
+    }
+    return await arender(request, 'chat.html', context)
@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import (
+    AvailabilityWindow,
+    CounselingSession,
+    CounselorAvailability,
+    CounselorProfile,
+    CounselorStats,
+)
+from .workload import refresh_counselor_stats
+
+
+def merge_intervals(intervals):
+    """Sort (start, end) pairs and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def subtract_interval(intervals, start, end):
+    """Remove [start, end) from a list of non-overlapping intervals"""
+    remaining = []
+    for slot_start, slot_end in intervals:
+        if slot_end <= start or slot_start >= end:
+            remaining.append((slot_start, slot_end))
+            continue
+        if slot_start < start:
+            remaining.append((slot_start, start))
+        if slot_end > end:
+            remaining.append((end, slot_end))
+    return remaining
+
+
+def day_intervals(counselor):
+    """Current intervals of a counselor as {day: [(start, end), ...]}"""
+    week = {day: [] for day, _ in CounselorAvailability.DAY_CHOICES}
+    for day, start, end in CounselorAvailability.objects.filter(
+            counselor=counselor).order_by('day', 'start_time').values_list(
+            'day', 'start_time', 'end_time'):
+        week[day].append((start, end))
+    return week
+
+
+def _write_days(counselor, week):
+    """
+    Make the stored rows of the given days match `week` ({day: intervals}).
+    Unchanged intervals keep their rows; everything else is one bulk delete
+    and one bulk insert.
+    """
+    existing = {}
+    for slot in CounselorAvailability.objects.select_for_update().filter(
+            counselor=counselor, day__in=list(week)):
+        existing[slot.day, slot.start_time, slot.end_time] = slot.pk
+
+    wanted = {(day, start, end)
+              for day, intervals in week.items()
+              for start, end in merge_intervals(intervals)}
+
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        CounselorAvailability.objects.filter(pk__in=stale).delete()
+    CounselorAvailability.objects.bulk_create([
+        CounselorAvailability(counselor=counselor, day=day, start_time=start, end_time=end)
+        for day, start, end in sorted(wanted - set(existing))
+    ])
+    # Bulk writes skip the stats and projection signals
+    refresh_counselor_stats(counselor.pk)
+    refresh_projection(counselor.pk)
+
+
+def add_slot(counselor, day, start_time, end_time):
+    with transaction.atomic():
+        intervals = day_intervals(counselor)[day]
+        _write_days(counselor, {day: intervals + [(start_time, end_time)]})
+
+
+def remove_slot(counselor, day, start_time, end_time):
+    with transaction.atomic():
+        intervals = day_intervals(counselor)[day]
+        _write_days(counselor, {day: subtract_interval(intervals, start_time, end_time)})
+
+
+def apply_weekly_template(counselor, week):
+    """Replace the whole week ({day: intervals}, missing days are cleared) at once"""
+    with transaction.atomic():
+        _write_days(counselor, {
+            day: week.get(day, []) for day, _ in CounselorAvailability.DAY_CHOICES})
+
+
+def week_bounds(when=None):
+    """Start (Monday 00:00, local time) and end of the week containing `when`"""
+    local = timezone.localtime(when)
+    start = timezone.make_aware(
+        datetime.combine(local.date() - timedelta(days=local.weekday()), datetime.min.time()))
+    return start, start + timedelta(weeks=1)
+
+
+def weekly_free_minutes(counselor_ids=None, when=None):
+    """
+    Available minutes minus minutes of scheduled sessions in the week of
+    `when`, per counselor. Reads the materialized available total from
+    CounselorStats and the booked minutes with one grouped query.
+    """
+    start, end = week_bounds(when)
+    stats = CounselorStats.objects.all()
+    sessions = CounselingSession.objects.filter(
+        status='scheduled', scheduled_time__gte=start, scheduled_time__lt=end)
+    if counselor_ids is not None:
+        stats = stats.filter(counselor_id__in=counselor_ids)
+        sessions = sessions.filter(assignment__counselor_id__in=counselor_ids)
+
+    booked = dict(sessions.values_list('assignment__counselor_id').annotate(
+        minutes=Sum('duration_minutes')).order_by())
+    return {
+        counselor_id: max(available - booked.get(counselor_id, 0), 0)
+        for counselor_id, available in stats.values_list(
+            'counselor_id', 'weekly_available_minutes')
+    }
+
+
+def projection_weeks():
+    return getattr(settings, 'AVAILABILITY_PROJECTION_WEEKS', 12)
+
+
+def get_zone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.get_default_timezone()
+
+
+def counselor_zone(counselor_id):
+    name = CounselorProfile.objects.filter(
+        user_id=counselor_id).values_list('timezone', flat=True).first()
+    return get_zone(name) if name else timezone.get_default_timezone()
+
+
+def project(week, zone, start, end):
+    """
+    UTC intervals of a weekly pattern ({day: [(start, end), ...]} in local
+    time of `zone`) that overlap [start, end). Each local date is converted
+    on its own, so intervals after a DST change get the new offset.
+    """
+    windows = []
+    day = start.astimezone(zone).date() - timedelta(days=1)
+    last = end.astimezone(zone).date() + timedelta(days=1)
+    while day <= last:
+        for slot_start, slot_end in week[day.weekday()]:
+            window_start = datetime.combine(day, slot_start, tzinfo=zone).astimezone(dt_timezone.utc)
+            window_end = datetime.combine(day, slot_end, tzinfo=zone).astimezone(dt_timezone.utc)
+            if window_start < window_end and window_end > start and window_start < end:
+                windows.append((window_start, window_end))
+        day += timedelta(days=1)
+    return windows
+
+
+def refresh_projection(counselor_id):
+    """Rebuild the projected UTC windows of one counselor for the upcoming weeks"""
+    now = timezone.now()
+    horizon = now + timedelta(weeks=projection_weeks())
+    zone = counselor_zone(counselor_id)
+    week = day_intervals(counselor_id)
+    with transaction.atomic():
+        AvailabilityWindow.objects.filter(counselor_id=counselor_id).delete()
+        AvailabilityWindow.objects.bulk_create([
+            AvailabilityWindow(counselor_id=counselor_id, start=start, end=end)
+            for start, end in project(week, zone, now - timedelta(days=1), horizon)
+        ])
+        CounselorProfile.objects.filter(user_id=counselor_id).update(
+            availability_projected_until=horizon)
+
+
+def refresh_all_projections():
+    count = 0
+    for counselor_id in CounselorProfile.objects.values_list('user_id', flat=True).iterator():
+        refresh_projection(counselor_id)
+        count += 1
+    return count
+
+
+def _projection_covers(counselor_id, start, end):
+    projected_until = CounselorProfile.objects.filter(
+        user_id=counselor_id).values_list('availability_projected_until', flat=True).first()
+    return (projected_until is not None and end <= projected_until
+            and start >= projected_until - timedelta(weeks=projection_weeks()))
+
+
+def windows_between(counselor_id, start, end):
+    """
+    UTC availability windows overlapping [start, end), from the projection
+    table when it covers the range, computed on the fly otherwise.
+    """
+    if _projection_covers(counselor_id, start, end):
+        return list(AvailabilityWindow.objects.filter(
+            counselor_id=counselor_id, start__lt=end, end__gt=start
+        ).order_by('start').values_list('start', 'end'))
+    return project(day_intervals(counselor_id), counselor_zone(counselor_id), start, end)
+
+
+def is_available(counselor_id, start, end):
+    """Whether [start, end) lies inside one availability window"""
+    if _projection_covers(counselor_id, start, end):
+        return AvailabilityWindow.objects.filter(
+            counselor_id=counselor_id, start__lte=start, end__gte=end).exists()
+    windows = project(day_intervals(counselor_id), counselor_zone(counselor_id), start, end)
+    return any(window_start <= start and end <= window_end
+               for window_start, window_end in windows)
@@ -0,0 +1,182 @@
+import csv
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .models import CounselorProfile, User, UserProfile
+
+PROFILE_MODELS = {
+    'user': UserProfile,
+    'counselor': CounselorProfile,
+}
+
+USER_COLUMNS = ('phone_number',)
+PROFILE_COLUMNS = {
+    'user': ('full_name', 'gender', 'age', 'address', 'emergency_contact'),
+    'counselor': ('full_name', 'specialization', 'qualification', 'experience_years', 'bio'),
+}
+REQUIRED_COLUMNS = ('user_type', 'email', 'full_name')
+INSERT_ATTEMPTS = 3
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (line number, email, [messages])
+
+    def add_error(self, row, messages):
+        self.errors.append((row.line, row.email, messages))
+
+
+class ImportRow:
+    def __init__(self, line, data):
+        self.line = line
+        self.data = {key.strip().lower(): (value or '').strip()
+                     for key, value in data.items() if key}
+        self.user_type = self.data.get('user_type', '').lower()
+        self.email = User.objects.normalize_email(self.data.get('email', ''))
+        self.user = None
+        self.profile = None
+
+
+def _build(row):
+    """Validate a row on its own and build unsaved model instances"""
+    errors = []
+    if row.user_type not in PROFILE_MODELS:
+        return [f"user_type must be one of: {', '.join(PROFILE_MODELS)}"]
+    try:
+        validate_email(row.email)
+    except ValidationError:
+        errors.append("Enter a valid email address.")
+
+    user = User(email=row.email, user_type=row.user_type,
+                **{c: row.data.get(c) or None for c in USER_COLUMNS})
+    profile_model = PROFILE_MODELS[row.user_type]
+    profile = profile_model(**{
+        c: row.data[c] for c in PROFILE_COLUMNS[row.user_type] if row.data.get(c)})
+
+    for instance, exclude in ((user, ['password']), (profile, ['user'])):
+        try:
+            instance.full_clean(exclude=exclude, validate_unique=False,
+                                validate_constraints=False)
+        except ValidationError as exc:
+            errors.extend(f"{field}: {' '.join(messages)}"
+                          for field, messages in exc.message_dict.items())
+
+    row.user, row.profile = user, profile
+    return errors
+
+
+def _validate_chunk(rows, result):
+    """Per-row checks plus one IN query for emails that are already taken"""
+    seen = set()
+    valid = []
+    for row in rows:
+        errors = _build(row)
+        if row.email in seen:
+            errors.append("Email appears more than once in the file.")
+        seen.add(row.email)
+        if errors:
+            result.add_error(row, errors)
+        else:
+            valid.append(row)
+
+    return _drop_existing(valid, result)
+
+
+def _drop_existing(rows, result):
+    existing = set(User.objects.filter(
+        email__in=[row.email for row in rows]).values_list('email', flat=True))
+    for row in rows:
+        if row.email in existing:
+            result.add_error(row, ["A user with this email already exists."])
+    return [row for row in rows if row.email not in existing]
+
+
+def _insert_chunk(rows):
+    with transaction.atomic():
+        users = User.objects.bulk_create([row.user for row in rows])
+        for row, user in zip(rows, users):
+            row.profile.user = user
+        for profile_model in PROFILE_MODELS.values():
+            profiles = [row.profile for row in rows if isinstance(row.profile, profile_model)]
+            if profiles:
+                profile_model.objects.bulk_create(profiles)
+
+
+def _reset(rows):
+    # A rolled back bulk_create leaves the ids it assigned on the instances
+    for row in rows:
+        for instance in (row.user, row.profile):
+            instance.pk = None
+            instance._state.adding = True
+        row.profile.user = None
+
+
+def _insert(rows, result):
+    """Insert validated rows; returns the rows that were saved"""
+    for _ in range(INSERT_ATTEMPTS):
+        try:
+            _insert_chunk(rows)
+            return rows
+        except IntegrityError:
+            # Someone registered one of the emails since the check
+            _reset(rows)
+            rows = _drop_existing(rows, result)
+    for row in rows:
+        result.add_error(row, ["Could not be saved, import this row again."])
+    return []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_pool(workers=None):
+    """Password hashing workers, started on the first import of the process"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+def import_users(csv_file, batch_size=None, workers=None):
+    """
+    Create users and counselors (with their profiles) from a CSV file.
+
+    Rows are read and processed batch_size at a time. A row with a blank
+    password gets an unusable one. Rows that fail validation are reported
+    in the result and skipped; the rest of the file is still imported.
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 500)
+    workers = workers or getattr(settings, 'IMPORT_HASH_WORKERS', None)
+    result = ImportResult()
+
+    reader = csv.DictReader(csv_file)
+    headers = [h.strip().lower() for h in reader.fieldnames or []]
+    missing = [c for c in REQUIRED_COLUMNS if c not in headers]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    rows = (ImportRow(reader.line_num, data) for data in reader)
+    pool = hash_pool(workers)
+    while True:
+        chunk = list(itertools.islice(rows, batch_size))
+        if not chunk:
+            break
+        valid = _validate_chunk(chunk, result)
+        passwords = [row.data.get('password') or None for row in valid]
+        for row, hashed in zip(valid, pool.map(
+                make_password, passwords, chunksize=max(1, len(valid) // 16))):
+            row.user.password = hashed
+        result.created += len(_insert(valid, result))
+    result.errors.sort(key=lambda error: error[0])
+    return result
@@ -1,6 +1,9 @@
+from functools import wraps
+
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import user_passes_test
 from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
 
 
 def user_type_required(user_type, login_url=None, redirect_field_name=REDIRECT_FIELD_NAME):
@@ -83,4 +86,17 @@ def admin_required(function=None, redirect_field_name=REDIRECT_FIELD_NAME, login
     )
     if function:
         return actual_decorator(function)
-    return actual_decorator
\ No newline at end of file
+    return actual_decorator
+
+
+def api_login_required(view_func):
+    """
+    Decorator for API views that answers unauthenticated requests with a
+    JSON 401 instead of redirecting to the login page.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,268 @@
+import logging
+import smtplib
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from . import messaging
+from .availability import get_zone
+from .models import (
+    ConversationReadState,
+    CounselingSession,
+    CounselorAssignment,
+    CounselorProfile,
+    DigestState,
+    Message,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+
+# One email per recipient instead of one per message. Each batch of
+# recipients costs a fixed number of queries: one grouped query counts the
+# unread messages of the whole batch per conversation, one more finds the
+# upcoming sessions. DigestState remembers what was reported, so nothing is
+# reported twice.
+
+Digest = namedtuple('Digest', ['recipient', 'zone', 'conversations', 'sessions',
+                               'last_message_id', 'sessions_until'])
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def recipient_batches(batch_size):
+    """Ids of active users with an email address, in primary key order"""
+    last = 0
+    while True:
+        ids = list(User.objects.filter(is_active=True, pk__gt=last).exclude(
+            email='').order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def unread_messages(recipient_ids, since, until):
+    """
+    {recipient id: {sender id: (count, newest id, assignment id)}} of the
+    messages received between `since` and `until` that came after the
+    recipient's last digest and are past the recipient's read mark.
+    """
+    digested = DigestState.objects.filter(
+        recipient=OuterRef('receiver')).values('last_message_id')
+    read = ConversationReadState.objects.filter(
+        Q(assignment__counselor=OuterRef('sender')) | Q(assignment__user=OuterRef('sender')),
+        reader=OuterRef('receiver'),
+        last_read_message_id__gte=OuterRef('id'),
+    )
+    rows = (
+        Message.objects
+        .filter(receiver_id__in=recipient_ids, timestamp__range=(since, until),
+                id__gt=Coalesce(Subquery(digested), Value(0)))
+        .filter(~Exists(read))
+        .values('receiver_id', 'sender_id')
+        .annotate(count=Count('id'), newest=Max('id'))
+        .order_by()
+    )
+    unread = defaultdict(dict)
+    for row in rows:
+        unread[row['receiver_id']][row['sender_id']] = (row['count'], row['newest'])
+    if not unread:
+        return unread
+
+    assignment_ids = _assignment_ids(set(unread).union(*unread.values()))
+    _drop_read_in_cache(unread, assignment_ids)
+    for recipient_id, senders in unread.items():
+        for sender_id, (count, newest) in list(senders.items()):
+            conversation = assignment_ids[frozenset((recipient_id, sender_id))]
+            if conversation:
+                senders[sender_id] = (count, newest, conversation[0])
+            else:
+                # Messages outside any assignment can't be opened in the chat
+                del senders[sender_id]
+    return unread
+
+
+def _assignment_ids(people):
+    """{frozenset of the two ends: assignment ids, active then newest first}"""
+    assignment_ids = defaultdict(list)
+    rows = CounselorAssignment.objects.filter(
+        user_id__in=people, counselor_id__in=people).values_list(
+        'id', 'user_id', 'counselor_id', 'status')
+    for assignment_id, user_id, counselor_id, _ in sorted(
+            rows, key=lambda row: (row[3] == 'active', row[0]), reverse=True):
+        assignment_ids[frozenset((user_id, counselor_id))].append(assignment_id)
+    return assignment_ids
+
+
+def _drop_read_in_cache(unread, assignment_ids):
+    # Read marks newer than the stored ones are only in the cache (see
+    # messaging.mark_read); drop conversations read up to their newest message
+    marks = messaging.cached_read_marks(
+        (assignment_id, recipient_id)
+        for recipient_id, senders in unread.items() for sender_id in senders
+        for assignment_id in assignment_ids[frozenset((recipient_id, sender_id))])
+    for recipient_id, senders in unread.items():
+        for sender_id, (_, newest) in list(senders.items()):
+            if any(marks.get((assignment_id, recipient_id), 0) >= newest
+                   for assignment_id in assignment_ids[frozenset((recipient_id, sender_id))]):
+                del senders[sender_id]
+
+
+def upcoming_sessions(recipient_ids, start, end):
+    """
+    {recipient id: [(scheduled time, duration, updated at, partner id)]} of
+    the scheduled sessions between `start` and `end`
+    """
+    wanted = set(recipient_ids)
+    rows = CounselingSession.objects.filter(
+        Q(assignment__user_id__in=recipient_ids) | Q(assignment__counselor_id__in=recipient_ids),
+        status='scheduled', scheduled_time__gt=start, scheduled_time__lte=end,
+    ).order_by('scheduled_time').values_list(
+        'scheduled_time', 'duration_minutes', 'updated_at',
+        'assignment__user_id', 'assignment__counselor_id')
+    upcoming = defaultdict(list)
+    for scheduled_time, duration, updated_at, user_id, counselor_id in rows:
+        for recipient_id, partner_id in ((user_id, counselor_id), (counselor_id, user_id)):
+            if recipient_id in wanted:
+                upcoming[recipient_id].append((scheduled_time, duration, updated_at, partner_id))
+    return upcoming
+
+
+def _is_new(session, state):
+    scheduled_time, _, updated_at, _ = session
+    if state is None or state.sessions_until is None:
+        return True
+    # Booked or moved since the last digest, or newly inside the window
+    return scheduled_time > state.sessions_until or updated_at > state.last_sent_at
+
+
+def build_digests(recipient_ids, now):
+    """Digests of the recipients that are due one and have something new"""
+    states = {state.recipient_id: state for state in
+              DigestState.objects.filter(recipient_id__in=recipient_ids)}
+    not_before = now - timedelta(seconds=_setting('DIGEST_INTERVAL', 60 * 60))
+    due = [pk for pk in recipient_ids
+           if pk not in states or not states[pk].last_sent_at
+           or states[pk].last_sent_at <= not_before]
+    if not due:
+        return []
+
+    # Recent messages are left for the recipient to read in the app first
+    unread = unread_messages(
+        due,
+        now - timedelta(days=_setting('DIGEST_MAX_MESSAGE_AGE_DAYS', 7)),
+        now - timedelta(seconds=_setting('DIGEST_MESSAGE_DELAY', 15 * 60)))
+    sessions_until = now + timedelta(hours=_setting('DIGEST_SESSION_WINDOW_HOURS', 24))
+    sessions = {
+        recipient_id: [s for s in upcoming if _is_new(s, states.get(recipient_id))]
+        for recipient_id, upcoming in upcoming_sessions(due, now, sessions_until).items()
+    }
+
+    recipients = [pk for pk in due if unread.get(pk) or sessions.get(pk)]
+    if not recipients:
+        return []
+    people = set(recipients)
+    for pk in recipients:
+        people.update(unread.get(pk, {}))
+        people.update(partner_id for *_, partner_id in sessions.get(pk, []))
+    users = User.objects.select_related(
+        'user_profile', 'counselor_profile').in_bulk(people)
+    zones = dict(CounselorProfile.objects.filter(
+        user_id__in=recipients).exclude(timezone='').values_list('user_id', 'timezone'))
+
+    digests = []
+    for pk in recipients:
+        zone = get_zone(zones[pk]) if pk in zones else timezone.get_default_timezone()
+        senders = unread.get(pk, {})
+        previous = states[pk].last_message_id if pk in states else 0
+        digests.append(Digest(
+            recipient=users[pk],
+            zone=zone,
+            conversations=[(users[sender_id], count, assignment_id)
+                           for sender_id, (count, _, assignment_id) in senders.items()],
+            sessions=[(scheduled_time, duration, users[partner_id])
+                      for scheduled_time, duration, _, partner_id in sessions.get(pk, [])],
+            last_message_id=max([previous] + [newest for _, newest, _ in senders.values()]),
+            sessions_until=sessions_until,
+        ))
+    return digests
+
+
+def digest_email(digest, connection=None):
+    message_count = sum(count for _, count, _ in digest.conversations)
+    parts = []
+    if message_count:
+        parts.append(f"{message_count} unread message{'s' if message_count != 1 else ''}")
+    if digest.sessions:
+        parts.append(f"{len(digest.sessions)} upcoming session{'s' if len(digest.sessions) != 1 else ''}")
+    site_url = _setting('SITE_URL', 'http://localhost:8000').rstrip('/')
+    # Session times are rendered in the recipient's zone
+    with timezone.override(digest.zone):
+        body = render_to_string('emails/digest.txt', {
+            'recipient': digest.recipient,
+            'conversations': [
+                {'partner': partner, 'count': count,
+                 'url': site_url + reverse('chat_view', args=[assignment_id])}
+                for partner, count, assignment_id in digest.conversations
+            ],
+            'sessions': [
+                {'time': time, 'duration': duration, 'partner': partner}
+                for time, duration, partner in digest.sessions
+            ],
+            'site_url': site_url,
+        })
+    return EmailMessage(f"Protisruti: {' and '.join(parts)}", body,
+                        to=[digest.recipient.email], connection=connection)
+
+
+def record_sent(digests, now):
+    DigestState.objects.bulk_create(
+        [DigestState(recipient=digest.recipient, last_message_id=digest.last_message_id,
+                     sessions_until=digest.sessions_until, last_sent_at=now)
+         for digest in digests],
+        update_conflicts=True,
+        unique_fields=['recipient'],
+        update_fields=['last_message_id', 'sessions_until', 'last_sent_at'],
+    )
+
+
+def send_digests(now=None, connection=None, batch_size=None, record=True):
+    """
+    Build and send every digest that is due. All mail of the run goes
+    through one SMTP connection, reopened only after a failed send. A
+    recipient's DigestState only moves on once their digest was accepted.
+    Returns (sent, failed).
+    """
+    now = now or timezone.now()
+    connection = connection or get_connection()
+    batch_size = batch_size or _setting('DIGEST_BATCH_SIZE', 500)
+    sent = failed = 0
+    with connection:
+        for recipient_ids in recipient_batches(batch_size):
+            delivered = []
+            try:
+                for digest in build_digests(recipient_ids, now):
+                    try:
+                        connection.send_messages([digest_email(digest, connection)])
+                    except (smtplib.SMTPException, OSError):
+                        logger.exception("Digest to user %s failed", digest.recipient.pk)
+                        failed += 1
+                        connection.close()
+                        connection.open()
+                        continue
+                    delivered.append(digest)
+            finally:
+                if record:
+                    record_sent(delivered, now)
+            sent += len(delivered)
+    return sent, failed
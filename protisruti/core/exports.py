@@ -0,0 +1,144 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .fields import decompress_text
+from .models import ArchivedMessage, CounselingSession, CounselorAssignment, Message
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+
+
+class Dataset:
+    """
+    An exportable table: column name -> ORM lookup. Rows are read with
+    values_list().iterator(), so nothing but the current chunk is kept in
+    memory, and no model instances are built.
+    """
+
+    def __init__(self, label, querysets, date_field, columns, compressed=()):
+        self.label = label
+        self.querysets = querysets
+        self.date_field = date_field
+        self.columns = columns
+        self.compressed = set(compressed)
+
+    def rows(self, columns, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+        lookups = [self.columns[column] for column in columns]
+        decode = [i for i, column in enumerate(columns) if column in self.compressed]
+
+        for queryset in self.querysets():
+            if start:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': start})
+            if end:
+                queryset = queryset.filter(**{f'{self.date_field}__lt': end})
+            for row in queryset.order_by('pk').values_list(*lookups).iterator(
+                    chunk_size=chunk_size):
+                if decode:
+                    row = list(row)
+                    for i in decode:
+                        row[i] = decompress_text(row[i])
+                yield row
+
+
+DATASETS = {
+    'sessions': Dataset(
+        'Counseling sessions',
+        lambda: [CounselingSession.objects.all()],
+        'scheduled_time',
+        {
+            'id': 'pk',
+            'assignment_id': 'assignment_id',
+            'counselor_email': 'assignment__counselor__email',
+            'user_email': 'assignment__user__email',
+            'scheduled_time': 'scheduled_time',
+            'duration_minutes': 'duration_minutes',
+            'status': 'status',
+            'notes': 'notes',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        compressed=['notes'],
+    ),
+    'assignments': Dataset(
+        'Counselor assignments',
+        lambda: [CounselorAssignment.objects.all()],
+        'assigned_date',
+        {
+            'id': 'pk',
+            'counselor_email': 'counselor__email',
+            'user_email': 'user__email',
+            'status': 'status',
+            'assigned_date': 'assigned_date',
+            'last_session': 'last_session',
+            'notes': 'notes',
+        },
+        compressed=['notes'],
+    ),
+    'messages': Dataset(
+        'Messages (including archived)',
+        lambda: [ArchivedMessage.objects.all(), Message.objects.all()],
+        'timestamp',
+        {
+            'id': 'pk',
+            'sender_email': 'sender__email',
+            'receiver_email': 'receiver__email',
+            'timestamp': 'timestamp',
+            'content': 'content',
+        },
+        compressed=['content'],
+    ),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def resolve_columns(dataset, columns):
+    if not columns:
+        return list(dataset.columns)
+    unknown = [column for column in columns if column not in dataset.columns]
+    if unknown:
+        raise ExportError(f"Unknown column(s): {', '.join(unknown)}")
+    return list(columns)
+
+
+def day_bounds(start_date=None, end_date=None):
+    """Turn an inclusive date range into aware [start, end) datetimes"""
+    start = end = None
+    if start_date:
+        start = timezone.make_aware(datetime.combine(start_date, time.min))
+    if end_date:
+        end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_rows(dataset, columns, export_format, start=None, end=None):
+    """Yield the export one encoded line at a time"""
+    rows = dataset.rows(columns, start, end)
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    elif export_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=_json_value) + '\n'
+    else:
+        raise ExportError(f"Unknown format {export_format}")
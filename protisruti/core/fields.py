@@ -0,0 +1,151 @@
+import zlib
+
+from django import forms
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Stored values start with MAGIC followed by a codec byte. 0xC7 must be
+# followed by a continuation byte (0x80-0xBF) in UTF-8, and codec bytes are
+# all below 0x80, so a header can never be confused with plain text that
+# was written before the column was compressed.
+MAGIC = 0xC7
+CODEC_RAW = 0x00
+CODEC_ZLIB = 0x01
+CODEC_ZSTD = 0x02
+CODEC_ZLIB_DICT = 0x03  # followed by a one byte dictionary id
+
+
+class CompressedBytes(bytes):
+    """Raw column value that has not been decompressed yet"""
+
+
+def _dictionaries():
+    return getattr(settings, 'COMPRESSED_TEXT_DICTIONARIES', {})
+
+
+def compress_text(text):
+    data = text.encode('utf-8')
+    if len(data) < getattr(settings, 'COMPRESSED_TEXT_MIN_LENGTH', 64):
+        return bytes((MAGIC, CODEC_RAW)) + data
+
+    codec = getattr(settings, 'COMPRESSED_TEXT_CODEC', 'zlib')
+    level = getattr(settings, 'COMPRESSED_TEXT_LEVEL', 6)
+    dictionary_id = getattr(settings, 'COMPRESSED_TEXT_DICTIONARY_ID', None)
+
+    if codec == 'zstd' and zstandard is not None:
+        header = bytes((MAGIC, CODEC_ZSTD))
+        payload = zstandard.ZstdCompressor(level=level).compress(data)
+    elif dictionary_id is not None:
+        header = bytes((MAGIC, CODEC_ZLIB_DICT, dictionary_id))
+        compressor = zlib.compressobj(level, zdict=_dictionaries()[dictionary_id])
+        payload = compressor.compress(data) + compressor.flush()
+    else:
+        header = bytes((MAGIC, CODEC_ZLIB))
+        payload = zlib.compress(data, level)
+
+    if len(payload) >= len(data):
+        return bytes((MAGIC, CODEC_RAW)) + data
+    return header + payload
+
+
+def decompress_text(value):
+    """Decode a stored value; plain text from before compression passes through"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if len(value) < 2 or value[0] != MAGIC:
+        return value.decode('utf-8')
+
+    codec = value[1]
+    if codec == CODEC_RAW:
+        data = value[2:]
+    elif codec == CODEC_ZLIB:
+        data = zlib.decompress(value[2:])
+    elif codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd compressed text")
+        data = zstandard.ZstdDecompressor().decompress(value[2:])
+    elif codec == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=_dictionaries()[value[2]])
+        data = decompressor.decompress(value[3:]) + decompressor.flush()
+    else:
+        raise ValueError(f"Unknown compressed text codec {codec}")
+    return data.decode('utf-8')
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Keeps the raw column value on the instance and only decompresses it the
+    first time the attribute is read.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress_text(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text field stored compressed (zlib, zstd or zlib with a shared
+    dictionary, see COMPRESSED_TEXT_* settings). Behaves like a TextField on
+    model instances and in forms, but can't be filtered on.
+    """
+    descriptor_class = CompressedTextDescriptor
+    empty_values = [None, '', b'']
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def get_default(self):
+        if self.has_default():
+            return super().get_default()
+        return None if self.null else ''
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        return CompressedBytes(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            return compress_text(value)
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        defaults = {
+            'form_class': forms.CharField,
+            'widget': forms.Textarea,
+            'max_length': self.max_length,
+        }
+        defaults.update(kwargs)
+        return models.Field.formfield(self, **defaults)
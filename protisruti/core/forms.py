@@ -1,8 +1,14 @@
-from time import timezone
+import functools
+import uuid
+import zoneinfo
+from datetime import datetime
+
 from django import forms
+from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.core.validators import RegexValidator
-from .models import CounselingSession, CounselorAssignment, CounselorAvailability, User, UserProfile, CounselorProfile, VictimCounselorAssignment, Message
+from .models import CounselingSession, CounselorAssignment, CounselorAvailability, SessionSeries, User, UserProfile, CounselorProfile, Message
+from . import availability, scheduling
 
 
 class CustomAuthenticationForm(AuthenticationForm):
@@ -131,6 +137,13 @@ class CounselorRegistrationForm(UserCreationForm):
         return user
 
 
+@functools.lru_cache(maxsize=1)
+def timezone_choices():
+    # Scanning the tz database takes tens of milliseconds, so it happens on
+    # first use instead of at import
+    return [(name, name.replace('_', ' ')) for name in sorted(zoneinfo.available_timezones())]
+
+
 class CounselorProfileForm(forms.ModelForm):
     """
     Form for counselor profile information
@@ -159,11 +172,17 @@ class CounselorProfileForm(forms.ModelForm):
     verification_document = forms.FileField(widget=forms.FileInput(attrs={
         'class': 'form-control',
     }), required=False)
+    timezone = forms.ChoiceField(
+        choices=timezone_choices,
+        initial='UTC',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text='Your availability is interpreted in this time zone',
+    )
 
     class Meta:
         model = CounselorProfile
         fields = ['full_name', 'specialization', 'qualification',
-                  'experience_years', 'bio', 'verification_document']
+                  'experience_years', 'bio', 'verification_document', 'timezone']
 
 
 # Add these forms to core/forms.py
@@ -199,8 +218,9 @@ class CounselorAvailabilityForm(forms.ModelForm):
     """
     Form for counselors to set their availability
     """
-    day = forms.ChoiceField(
+    day = forms.TypedChoiceField(
         choices=CounselorAvailability.DAY_CHOICES,
+        coerce=int,
         widget=forms.Select(attrs={'class': 'form-control'})
     )
     start_time = forms.TimeField(
@@ -237,6 +257,52 @@ class CounselorAvailabilityForm(forms.ModelForm):
         return cleaned_data
 
 
+class WeeklyAvailabilityForm(forms.Form):
+    """
+    The whole weekly availability of a counselor, one field per day with
+    comma separated ranges like "09:00-12:00, 14:00-17:00"
+    """
+    RANGE_FORMAT = '%H:%M'
+
+    def __init__(self, *args, **kwargs):
+        week = kwargs.pop('week', None)
+        super().__init__(*args, **kwargs)
+        for day, label in CounselorAvailability.DAY_CHOICES:
+            self.fields[f'day_{day}'] = forms.CharField(
+                label=label,
+                required=False,
+                widget=forms.TextInput(attrs={
+                    'class': 'form-control',
+                    'placeholder': 'e.g. 09:00-12:00, 14:00-17:00'
+                })
+            )
+            if week is not None:
+                self.initial[f'day_{day}'] = ', '.join(
+                    f"{start:%H:%M}-{end:%H:%M}" for start, end in week[day])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        week = {}
+        for day, label in CounselorAvailability.DAY_CHOICES:
+            intervals = []
+            for part in (cleaned_data.get(f'day_{day}') or '').split(','):
+                if not part.strip():
+                    continue
+                try:
+                    start, end = (datetime.strptime(value.strip(), self.RANGE_FORMAT).time()
+                                  for value in part.split('-'))
+                except ValueError:
+                    self.add_error(f'day_{day}', f'"{part.strip()}" is not a range like 09:00-12:00')
+                    continue
+                if start >= end:
+                    self.add_error(f'day_{day}', f'"{part.strip()}" ends before it starts')
+                    continue
+                intervals.append((start, end))
+            week[day] = intervals
+        cleaned_data['week'] = week
+        return cleaned_data
+
+
 class CounselingSessionForm(forms.ModelForm):
     """
     Form for scheduling counseling sessions
@@ -280,27 +346,16 @@ class CounselingSessionForm(forms.ModelForm):
 
         # If counselor is provided, check availability
         if self.counselor and scheduled_time:
-            # Get day of week as lowercase string
-            day_of_week = scheduled_time.strftime('%A').lower()
-            time_of_day = scheduled_time.time()
-
-            # Check if counselor is available at this time
-            availability_exists = CounselorAvailability.objects.filter(
-                counselor=self.counselor,
-                day=day_of_week,
-                start_time__lte=time_of_day,
-                end_time__gte=time_of_day,
-                is_available=True
-            ).exists()
-
-            if not availability_exists:
+            duration = self.cleaned_data.get('duration_minutes', 60)
+            session_end_time = scheduled_time + \
+                timezone.timedelta(minutes=int(duration))
+
+            # Range lookup in the counselor's projected UTC availability
+            if not availability.is_available(self.counselor.pk, scheduled_time, session_end_time):
                 raise forms.ValidationError(
                     "The counselor is not available at this time")
 
             # Check if counselor already has a session at this time
-            duration = self.cleaned_data.get('duration_minutes', 60)
-            session_end_time = scheduled_time + \
-                timezone.timedelta(minutes=int(duration))
 
             counselor_assignments = CounselorAssignment.objects.filter(
                 counselor=self.counselor, status='active')
@@ -318,7 +373,150 @@ class CounselingSessionForm(forms.ModelForm):
         return scheduled_time
 
 
-class UserCounselorAssignmentForm(forms.ModelForm):
+DURATION_CHOICES = [(30, '30 minutes'), (45, '45 minutes'),
+                    (60, '1 hour'), (90, '1.5 hours'), (120, '2 hours')]
+
+
+class SessionSeriesForm(forms.ModelForm):
+    """
+    Form for scheduling a weekly or biweekly series of sessions
+    """
+    start_time = forms.DateTimeField(
+        label='First session',
+        widget=forms.DateTimeInput(attrs={
+            'class': 'form-control',
+            'type': 'datetime-local'
+        })
+    )
+    duration_minutes = forms.TypedChoiceField(
+        choices=DURATION_CHOICES,
+        coerce=int,
+        initial=60,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    interval_weeks = forms.TypedChoiceField(
+        label='Repeats',
+        choices=SessionSeries.INTERVAL_CHOICES,
+        coerce=int,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    until = forms.DateField(
+        label='Until',
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    count = forms.IntegerField(
+        label='Number of sessions',
+        required=False,
+        min_value=1,
+        max_value=scheduling.SERIES_MAX_OCCURRENCES,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    class Meta:
+        model = SessionSeries
+        fields = ['start_time', 'duration_minutes', 'interval_weeks', 'until', 'count']
+
+    def __init__(self, *args, **kwargs):
+        self.counselor = kwargs.pop('counselor', None)
+        super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_time = cleaned_data.get('start_time')
+        until = cleaned_data.get('until')
+        count = cleaned_data.get('count')
+
+        if not until and not count:
+            raise forms.ValidationError(
+                "Give either an end date or a number of sessions")
+        if start_time and start_time <= timezone.now():
+            self.add_error('start_time', "The first session must be in the future")
+        if start_time and until and until < start_time.date():
+            self.add_error('until', "The end date must be after the first session")
+        if self.errors or not self.counselor:
+            return cleaned_data
+
+        times = [when for _, when in scheduling.occurrences(
+            start_time, cleaned_data['interval_weeks'], until, count,
+            zone=availability.counselor_zone(self.counselor.pk))]
+        for problem in scheduling.find_conflicts(
+                self.counselor, times, cleaned_data['duration_minutes']):
+            self.add_error(None, problem)
+        return cleaned_data
+
+
+class SeriesEditForm(forms.Form):
+    """
+    Form for moving a session and all later sessions of its series
+    """
+    scheduled_time = forms.DateTimeField(
+        widget=forms.DateTimeInput(attrs={
+            'class': 'form-control',
+            'type': 'datetime-local'
+        })
+    )
+    duration_minutes = forms.TypedChoiceField(
+        choices=DURATION_CHOICES,
+        coerce=int,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.session = kwargs.pop('session')
+        kwargs.setdefault('initial', {
+            'scheduled_time': timezone.localtime(self.session.scheduled_time).strftime('%Y-%m-%dT%H:%M'),
+            'duration_minutes': self.session.duration_minutes,
+        })
+        super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        scheduled_time = cleaned_data.get('scheduled_time')
+        if not scheduled_time:
+            return cleaned_data
+        if scheduled_time <= timezone.now():
+            raise forms.ValidationError("Scheduled time must be in the future")
+
+        series = self.session.series
+        remaining = series.count - self.session.occurrence if series.count is not None else None
+        times = [when for _, when in scheduling.occurrences(
+            scheduled_time, series.interval_weeks, series.until, remaining,
+            zone=availability.counselor_zone(series.assignment.counselor_id))]
+        for problem in scheduling.find_conflicts(
+                series.assignment.counselor, times, cleaned_data['duration_minutes'],
+                exclude_series=series):
+            self.add_error(None, problem)
+        return cleaned_data
+
+
+class VersionedModelForm(forms.ModelForm):
+    """
+    ModelForm for models saved with optimistic locking (a `version` field).
+    The version the form was rendered with travels in a hidden field, so an
+    edit made on top of someone else's newer change is rejected with a form
+    error instead of silently overwriting it.
+    """
+    loaded_version = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    stale_message = ("Someone else changed this record while you were editing it. "
+                     "Reload the page to see their changes.")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['loaded_version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk:
+            loaded = cleaned_data.get('loaded_version')
+            if loaded != self.instance.version:
+                raise forms.ValidationError(self.stale_message, code='stale')
+        return cleaned_data
+
+
+class UserCounselorAssignmentForm(VersionedModelForm):
     """
     Form for assigning users to counselors
     """
@@ -354,16 +552,63 @@ class UserCounselorAssignmentForm(forms.ModelForm):
         self.fields['user'].widget.attrs.update({'class': 'form-control'})
 
 
-class VictimCounselorAssignmentForm(forms.ModelForm):
-    class Meta:
-        model = VictimCounselorAssignment
-        fields = ['victim', 'counselor']
-
-
 class MessageForm(forms.ModelForm):
     class Meta:
         model = Message
-        fields = ['content']
+        fields = ['content', 'client_id']
         widgets = {
             'content': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Type your message here...', 'rows': 3}),
+            'client_id': forms.HiddenInput(),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A fresh id per rendered form makes a double submit store one message
+        if not self.is_bound:
+            self.initial.setdefault('client_id', uuid.uuid4())
+
+
+class ExportForm(forms.Form):
+    """
+    Column, format and date range selection for one export dataset
+    """
+    format = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')],
+        initial='csv',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    columns = forms.MultipleChoiceField(
+        required=False,
+        widget=forms.CheckboxSelectMultiple
+    )
+    start = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    end = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        dataset = kwargs.pop('dataset')
+        super().__init__(*args, **kwargs)
+        self.fields['columns'].choices = [(c, c) for c in dataset.columns]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("Start date must be before end date")
+        return cleaned_data
+
+
+class ImportUsersForm(forms.Form):
+    """
+    CSV upload for bulk creating users and counselors
+    """
+    csv_file = forms.FileField(
+        label='CSV file',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
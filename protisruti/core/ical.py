@@ -0,0 +1,241 @@
+import secrets
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .availability import counselor_zone
+from .models import CalendarFeedToken, CounselingSession, CounselorAvailability
+
+PRODID = '-//Protisruti//Counseling Sessions//EN'
+FEED_PAST_DAYS = 90
+# Years of offset changes written into a VTIMEZONE
+VTIMEZONE_YEARS = 10
+
+ICAL_WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+ICAL_STATUS = {
+    'scheduled': 'CONFIRMED',
+    'in_progress': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+    'missed': 'CANCELLED',
+}
+
+
+def get_feed_token(user, regenerate=False):
+    feed, created = CalendarFeedToken.objects.get_or_create(
+        user=user, defaults={'token': secrets.token_urlsafe(32)})
+    if regenerate and not created:
+        feed.token = secrets.token_urlsafe(32)
+        feed.save(update_fields=['token'])
+    return feed
+
+
+def feed_sessions(user):
+    queryset = CounselingSession.objects.filter(
+        scheduled_time__gte=timezone.now() - timedelta(days=FEED_PAST_DAYS))
+    if user.user_type == 'counselor':
+        return queryset.filter(assignment__counselor=user)
+    return queryset.filter(assignment__user=user)
+
+
+def feed_availabilities(user):
+    if user.user_type != 'counselor':
+        return CounselorAvailability.objects.none()
+    return CounselorAvailability.objects.filter(counselor=user, is_available=True)
+
+
+def feed_zone(user):
+    """Zone the availability pattern of a feed is written in"""
+    if user.user_type == 'counselor':
+        return counselor_zone(user.pk)
+    return timezone.get_default_timezone()
+
+
+def feed_version(user):
+    """
+    (last modified, etag) of a feed. Row counts are part of the ETag so a
+    deleted session or slot changes it even though no updated_at moves, and
+    so is the zone, which changes every availability time without touching
+    a slot.
+    """
+    sessions = feed_sessions(user).aggregate(latest=Max('updated_at'), count=Count('pk'))
+    slots = CounselorAvailability.objects.filter(counselor=user).aggregate(
+        latest=Max('updated_at'), count=Count('pk', filter=Q(is_available=True)))
+    latest = max((value for value in (sessions['latest'], slots['latest']) if value),
+                 default=None)
+    stamp = latest.timestamp() if latest else 0
+    return latest, f'"{stamp:.6f}-{sessions["count"]}-{slots["count"]}-{feed_zone(user)}"'
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts = []
+    while data:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(data))
+        # Don't split inside a multi-byte character
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def format_offset(value):
+    seconds = int(value.total_seconds())
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{sign}{hours:02d}{minutes:02d}' + (f'{seconds:02d}' if seconds else '')
+
+
+def zone_transitions(zone, start, end):
+    """
+    UTC datetimes between the aware datetimes `start` and `end` at which
+    the UTC offset of `zone` changes. Each day is checked, and a change is
+    narrowed down to the second. Works on timestamps: arithmetic on aware
+    datetimes would be in wall time.
+    """
+    def offset(stamp):
+        return datetime.fromtimestamp(stamp, zone).utcoffset()
+
+    transitions = []
+    day = 24 * 60 * 60
+    moment, end = int(start.timestamp()), end.timestamp()
+    while moment < end:
+        following = moment + day
+        if offset(following) != offset(moment):
+            low, high = moment, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if offset(middle) == offset(low):
+                    low = middle
+                else:
+                    high = middle
+            transitions.append(datetime.fromtimestamp(high, dt_timezone.utc))
+        moment = following
+    return transitions
+
+
+def render_vtimezone(zone, start):
+    """
+    VTIMEZONE of `zone` from `start` on: one observance for the offset in
+    effect at `start`, then one per offset change in the next
+    VTIMEZONE_YEARS years. DTSTART of an observance is the local time in
+    the offset it replaces.
+    """
+    start = start.astimezone(dt_timezone.utc)
+    observances = [(start, start.astimezone(zone).utcoffset())]
+    observances += [
+        (moment, (moment - timedelta(seconds=1)).astimezone(zone).utcoffset())
+        for moment in zone_transitions(zone, start, start + timedelta(days=365 * VTIMEZONE_YEARS))
+    ]
+
+    yield 'BEGIN:VTIMEZONE\r\n'
+    yield fold(f'TZID:{zone}')
+    for moment, offset_from in observances:
+        local = moment.astimezone(zone)
+        kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        yield f'BEGIN:{kind}\r\n'
+        yield f'DTSTART:{format_local(moment + offset_from)}\r\n'
+        yield f'TZOFFSETFROM:{format_offset(offset_from)}\r\n'
+        yield f'TZOFFSETTO:{format_offset(local.utcoffset())}\r\n'
+        if local.tzname():
+            yield fold('TZNAME:' + escape_text(local.tzname()))
+        yield f'END:{kind}\r\n'
+    yield 'END:VTIMEZONE\r\n'
+
+
+def next_weekday(weekday, start):
+    """First date on or after `start` falling on the given weekday (0 = Monday)"""
+    return start + timedelta(days=(weekday - start.weekday()) % 7)
+
+
+def participant_name(participant, profile, fallback):
+    """
+    Full name from a participant's profile. The feed is already streaming
+    when names are read, so a deleted counselor (the assignment keeps a
+    null) or a missing profile must not raise.
+    """
+    if participant is None:
+        return fallback
+    try:
+        return getattr(participant, profile).full_name or fallback
+    except ObjectDoesNotExist:
+        return fallback
+
+
+def render_feed(user, host):
+    """Yield the feed line by line, streaming sessions from the database"""
+    stamp = format_utc(timezone.now())
+    counselor = user.user_type == 'counselor'
+
+    yield 'BEGIN:VCALENDAR\r\n'
+    yield 'VERSION:2.0\r\n'
+    yield f'PRODID:{PRODID}\r\n'
+    yield 'CALSCALE:GREGORIAN\r\n'
+    yield fold('X-WR-CALNAME:' + escape_text('Protisruti sessions'))
+
+    # Availability is a weekly pattern in the counselor's own time zone,
+    # written with TZID so it keeps its local time across DST changes
+    zone = feed_zone(user)
+    today = timezone.localdate(timezone=zone)
+    slots = list(feed_availabilities(user).order_by('day', 'start_time'))
+    if slots:
+        yield from render_vtimezone(zone, datetime.combine(today, time.min, tzinfo=zone))
+
+    sessions = feed_sessions(user).select_related(
+        'assignment__user__user_profile', 'assignment__counselor__counselor_profile'
+    ).defer('notes').order_by('scheduled_time')
+    for session in sessions.iterator(chunk_size=500):
+        if counselor:
+            other = participant_name(session.assignment.user, 'user_profile', 'your client')
+        else:
+            other = participant_name(
+                session.assignment.counselor, 'counselor_profile', 'your counselor')
+        end = session.scheduled_time + timedelta(minutes=session.duration_minutes)
+        yield 'BEGIN:VEVENT\r\n'
+        yield f'UID:session-{session.pk}@{host}\r\n'
+        yield f'DTSTAMP:{stamp}\r\n'
+        yield f'LAST-MODIFIED:{format_utc(session.updated_at)}\r\n'
+        yield f'DTSTART:{format_utc(session.scheduled_time)}\r\n'
+        yield f'DTEND:{format_utc(end)}\r\n'
+        yield fold('SUMMARY:' + escape_text(f'Counseling session with {other}'))
+        yield f'STATUS:{ICAL_STATUS.get(session.status, "CONFIRMED")}\r\n'
+        yield 'END:VEVENT\r\n'
+
+    tzid = str(zone)
+    for slot in slots:
+        day = next_weekday(slot.day, today)
+        start = datetime.combine(day, slot.start_time)
+        end = datetime.combine(day, slot.end_time)
+        yield 'BEGIN:VEVENT\r\n'
+        yield f'UID:availability-{slot.pk}@{host}\r\n'
+        yield f'DTSTAMP:{stamp}\r\n'
+        yield f'LAST-MODIFIED:{format_utc(slot.updated_at)}\r\n'
+        yield fold(f'DTSTART;TZID={tzid}:{format_local(start)}')
+        yield fold(f'DTEND;TZID={tzid}:{format_local(end)}')
+        yield f'RRULE:FREQ=WEEKLY;BYDAY={ICAL_WEEKDAYS[slot.day]}\r\n'
+        yield 'SUMMARY:Available for sessions\r\n'
+        yield 'TRANSP:TRANSPARENT\r\n'
+        yield 'END:VEVENT\r\n'
+
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ArchivedMessage, Message
+
+ARCHIVED_FIELDS = ('id', 'sender_id', 'receiver_id', 'content', 'timestamp')
+
+
+class Command(BaseCommand):
+    help = "Move messages older than MESSAGE_ARCHIVE_AFTER_DAYS into the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.MESSAGE_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Stop after this many batches (for throttled runs)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        batch_size = options['batch_size']
+        moved = batches = 0
+
+        while options['max_batches'] is None or batches < options['max_batches']:
+            with transaction.atomic():
+                rows = list(
+                    Message.objects.filter(timestamp__lt=cutoff)
+                    .order_by('id')
+                    .values(*ARCHIVED_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                ArchivedMessage.objects.bulk_create(
+                    [ArchivedMessage(**row) for row in rows],
+                    ignore_conflicts=True,
+                )
+                Message.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
+            batches += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} message(s) older than {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.fields import compress_text, decompress_text
+from core.models import ArchivedMessage, CounselingSession, CounselorAssignment, Message
+
+COMPRESSED_FIELDS = [
+    (Message, 'content'),
+    (ArchivedMessage, 'content'),
+    (CounselingSession, 'notes'),
+    (CounselorAssignment, 'notes'),
+]
+
+
+class Command(BaseCommand):
+    help = "Report storage savings and read cost of the compressed text fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=5000,
+                            help="Rows to sample per field")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'field':<32}{'rows':>7}{'text KB':>10}{'stored KB':>11}"
+            f"{'ratio':>7}{'decode us/row':>15}{'encode us/row':>15}")
+
+        for model, field_name in COMPRESSED_FIELDS:
+            raw_values = [
+                value for value in model.objects.exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)[:options['sample']]
+            ]
+            if not raw_values:
+                continue
+
+            start = time.perf_counter()
+            texts = [decompress_text(value) for value in raw_values]
+            decode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for text in texts:
+                compress_text(text)
+            encode_time = time.perf_counter() - start
+
+            text_bytes = sum(len(text.encode('utf-8')) for text in texts)
+            stored_bytes = sum(
+                len(value.encode('utf-8')) if isinstance(value, str) else len(value)
+                for value in raw_values)
+            rows = len(raw_values)
+            label = f"{model.__name__}.{field_name}"
+            self.stdout.write(
+                f"{label:<32}{rows:>7}{text_bytes / 1024:>10.1f}{stored_bytes / 1024:>11.1f}"
+                f"{stored_bytes / max(text_bytes, 1):>7.2f}"
+                f"{decode_time / rows * 1e6:>15.1f}{encode_time / rows * 1e6:>15.1f}")
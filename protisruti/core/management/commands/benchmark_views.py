@@ -0,0 +1,89 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncRequestFactory, RequestFactory
+
+from core import async_views, views
+from core.models import CounselorAssignment, User
+
+VIEW_NAMES = ('user_dashboard', 'counselor_dashboard',
+              'view_assignments', 'assignment_detail')
+
+
+class Command(BaseCommand):
+    help = "Compare throughput of the sync and async implementations of the read-heavy views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="Existing user or counselor to request pages as")
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--view', choices=VIEW_NAMES, action='append',
+                            help="Limit the benchmark to these views")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError("No user with that email.")
+
+        kwargs_by_view = {name: {} for name in VIEW_NAMES}
+        if user.user_type == 'counselor':
+            applicable = ['counselor_dashboard', 'view_assignments']
+            assignment = CounselorAssignment.objects.filter(counselor=user).first()
+            if assignment:
+                applicable.append('assignment_detail')
+                kwargs_by_view['assignment_detail'] = {'assignment_id': assignment.pk}
+        else:
+            applicable = ['user_dashboard']
+        names = [n for n in (options['view'] or applicable) if n in applicable]
+
+        self.stdout.write(f"{'view':<22}{'sync req/s':>12}{'async req/s':>13}{'speedup':>9}")
+        for name in names:
+            kwargs = kwargs_by_view[name]
+            sync_rate = self.run_sync(getattr(views, name), user, kwargs, options)
+            async_rate = asyncio.run(
+                self.run_async(getattr(async_views, name), user, kwargs, options))
+            self.stdout.write(
+                f"{name:<22}{sync_rate:>12.1f}{async_rate:>13.1f}{async_rate / sync_rate:>8.2f}x")
+
+    def build_request(self, factory, user):
+        request = factory.get('/')
+        request.user = user
+
+        async def auser():
+            return user
+        request.auser = auser
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def run_sync(self, view, user, kwargs, options):
+        factory = RequestFactory()
+
+        def one(_):
+            try:
+                return view(self.build_request(factory, user), **kwargs)
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(one, range(options['requests'])))
+        return options['requests'] / (time.perf_counter() - start)
+
+    async def run_async(self, view, user, kwargs, options):
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def one():
+            async with semaphore:
+                return await view(self.build_request(factory, user), **kwargs)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options['requests'])))
+        return options['requests'] / (time.perf_counter() - start)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = "Stream sessions, assignments or messages to CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--columns', help="Comma separated column names (default: all)")
+        parser.add_argument('--start', help="First day to include, YYYY-MM-DD")
+        parser.add_argument('--end', help="Last day to include, YYYY-MM-DD")
+        parser.add_argument('--output', help="File to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        dataset = exports.DATASETS[options['dataset']]
+        try:
+            columns = exports.resolve_columns(
+                dataset, options['columns'].split(',') if options['columns'] else None)
+        except exports.ExportError as exc:
+            raise CommandError(exc)
+
+        dates = []
+        for option in ('start', 'end'):
+            value = options[option]
+            day = parse_date(value) if value else None
+            if value and day is None:
+                raise CommandError(f"Invalid --{option} date: {value}")
+            dates.append(day)
+        start, end = exports.day_bounds(*dates)
+
+        lines = exports.stream_rows(dataset, columns, options['format'], start, end)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
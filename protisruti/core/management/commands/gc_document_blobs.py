@@ -0,0 +1,70 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import CounselorProfile, DocumentBlob
+from core.storage import document_storage
+from core.uploads import preview_name
+
+
+class Command(BaseCommand):
+    help = "Delete verification document blobs that no counselor profile references"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help="Keep unreferenced blobs younger than this (uploads in flight)")
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help="Recount references from CounselorProfile before collecting")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            self.reconcile()
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        garbage = DocumentBlob.objects.filter(
+            ref_count__lte=0, updated_at__lt=cutoff)
+
+        deleted = 0
+        for blob in garbage.iterator():
+            if options['dry_run']:
+                self.stdout.write(f"Would delete {blob.name}")
+                deleted += 1
+                continue
+            with transaction.atomic():
+                # Re-check under a row lock in case a profile picked it up again
+                locked = DocumentBlob.objects.select_for_update().filter(
+                    pk=blob.pk, ref_count__lte=0).first()
+                if locked is None:
+                    continue
+                document_storage.delete(locked.name)
+                digest = os.path.splitext(os.path.basename(locked.name))[0]
+                document_storage.delete(preview_name(digest))
+                locked.delete()
+            deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Collected {deleted} blob(s)."))
+
+    def reconcile(self):
+        counts = dict(
+            CounselorProfile.objects.exclude(verification_document='')
+            .exclude(verification_document__isnull=True)
+            .values_list('verification_document')
+            .annotate(refs=Count('id'))
+        )
+        with transaction.atomic():
+            for blob in DocumentBlob.objects.select_for_update():
+                refs = counts.pop(blob.name, 0)
+                if blob.ref_count != refs:
+                    blob.ref_count = refs
+                    blob.save(update_fields=['ref_count', 'updated_at'])
+            DocumentBlob.objects.bulk_create(
+                [DocumentBlob(name=name, ref_count=refs)
+                 for name, refs in counts.items()])
+        self.stdout.write("Reference counts reconciled.")
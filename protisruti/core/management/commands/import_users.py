@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_import import import_users
+
+
+class Command(BaseCommand):
+    help = "Create users and counselors with their profiles from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--batch-size', type=int,
+                            help="Rows validated and inserted per batch")
+        parser.add_argument('--workers', type=int,
+                            help="Processes used to hash passwords")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as csv_file:
+                result = import_users(csv_file, options['batch_size'], options['workers'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        for line, email, problems in result.errors:
+            self.stderr.write(f"line {line} ({email or 'no email'}): {'; '.join(problems)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} account(s), skipped {len(result.errors)} row(s)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.scheduling import materialize_due
+
+
+class Command(BaseCommand):
+    help = ("Create the upcoming sessions of recurring series inside the rolling "
+            "SESSION_SERIES_WINDOW_WEEKS window. Run daily.")
+
+    def handle(self, *args, **options):
+        count = materialize_due()
+        self.stdout.write(self.style.SUCCESS(f"Created {count} session(s)."))
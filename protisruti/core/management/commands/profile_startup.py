@@ -0,0 +1,88 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve: set up Django and load the URLconf
+BOOT = ('import django; django.setup(); '
+        'from django.urls import get_resolver; get_resolver().url_patterns')
+
+
+def parse_importtime(output):
+    """(module, self µs, cumulative µs) rows of `python -X importtime` output"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = ("Measure how long a fresh process takes to boot the app and list the "
+            "slowest imports. Use --history to track the result over time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15,
+                            help="Number of slowest modules to list")
+        parser.add_argument('--history', help="JSON lines file to append the result to")
+        parser.add_argument('--label', default='', help="Stored with the result (e.g. a commit)")
+
+    def boot(self, importtime=False):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'protisruti.settings'))
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', BOOT]
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return elapsed, result.stderr
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        # The first run warms the OS file cache and the bytecode cache
+        self.boot()
+        timings = [self.boot()[0] for _ in range(options['runs'])]
+        median = statistics.median(timings)
+
+        _, output = self.boot(importtime=True)
+        rows = parse_importtime(output)
+        project = sum(own for name, own, _ in rows
+                      if name.split('.')[0] in ('core', 'protisruti'))
+
+        self.stdout.write(f"Boot time: median {median * 1000:.0f} ms, "
+                          f"min {min(timings) * 1000:.0f} ms over {len(timings)} runs")
+        self.stdout.write(f"Modules imported: {len(rows)}, "
+                          f"project code: {project / 1000:.1f} ms")
+        self.stdout.write(f"\n{'self ms':>8}{'cumul. ms':>11}  module")
+        for name, own, cumulative in sorted(rows, key=lambda row: -row[1])[:options['top']]:
+            self.stdout.write(f"{own / 1000:>8.1f}{cumulative / 1000:>11.1f}  {name}")
+
+        if options['history']:
+            previous = None
+            if os.path.exists(options['history']):
+                with open(options['history']) as history:
+                    lines = history.read().splitlines()
+                previous = json.loads(lines[-1]) if lines else None
+            entry = {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'label': options['label'],
+                'median_ms': round(median * 1000, 1),
+                'modules': len(rows),
+                'project_ms': round(project / 1000, 1),
+            }
+            with open(options['history'], 'a') as history:
+                history.write(json.dumps(entry) + '\n')
+            if previous:
+                change = entry['median_ms'] - previous['median_ms']
+                self.stdout.write(f"\nChange since {previous['timestamp']}: {change:+.1f} ms")
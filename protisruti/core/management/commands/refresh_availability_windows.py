@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.availability import refresh_all_projections
+
+
+class Command(BaseCommand):
+    help = ("Re-project every counselor's weekly availability onto UTC windows for "
+            "the next AVAILABILITY_PROJECTION_WEEKS weeks. Run daily.")
+
+    def handle(self, *args, **options):
+        count = refresh_all_projections()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} counselor(s)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.workload import reconcile_all_stats
+
+
+class Command(BaseCommand):
+    help = ("Recompute the materialized counselor workload stats. Run periodically "
+            "(e.g. hourly) so sessions that pass their time leave `upcoming_sessions`.")
+
+    def handle(self, *args, **options):
+        count = reconcile_all_stats()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled stats for {count} counselor(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import run_rollups
+
+
+class Command(BaseCommand):
+    help = ("Incrementally aggregate new registrations, messages and session outcomes "
+            "into the metric rollup tables. Run hourly from cron.")
+
+    def handle(self, *args, **options):
+        counts = run_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {counts['registrations']} registration(s), "
+            f"{counts['messages']} message(s) and {counts['session_days']} session day(s)."))
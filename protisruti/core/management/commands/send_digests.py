@@ -0,0 +1,29 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from core.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = ("Email every recipient a digest of their unread messages and upcoming "
+            "sessions. Run every few minutes; DIGEST_INTERVAL limits how often "
+            "one recipient is mailed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Recipients per query batch (default DIGEST_BATCH_SIZE)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Print the digests instead of sending or recording them")
+
+    def handle(self, *args, **options):
+        connection = None
+        if options['dry_run']:
+            connection = get_connection('django.core.mail.backends.console.EmailBackend',
+                                        stream=self.stdout)
+        sent, failed = send_digests(connection=connection, batch_size=options['batch_size'],
+                                    record=not options['dry_run'])
+        message = f"Sent {sent} digest(s)."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{message} {failed} failed, see the log."))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,90 @@
+import socketserver
+
+from django.core.management.base import BaseCommand
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP to accept mail from Django's SMTP backend: every
+    message is acknowledged and written to the command's output, nothing is
+    delivered.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 protisruti debugging server')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in iter(self.rfile.readline, b''):
+                    if raw in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    data.append(raw[1:] if raw.startswith(b'..') else raw)
+                self.server.deliver(sender, recipients, b''.join(data))
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, stdout):
+        super().__init__(address, SMTPSinkHandler)
+        self.stdout = stdout
+        self.received = 0
+
+    def deliver(self, sender, recipients, data):
+        self.received += 1
+        self.stdout.write(f"---------- message {self.received} from {sender} "
+                          f"to {', '.join(recipients)} ----------")
+        self.stdout.write(data.decode('utf-8', 'replace'))
+
+
+class Command(BaseCommand):
+    help = ("Run a local SMTP server that prints the mail it receives instead of "
+            "delivering it, for EMAIL_HOST/EMAIL_PORT during development and tests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        with SMTPSinkServer((options['host'], options['port']), self.stdout) as server:
+            self.stdout.write(f"Accepting mail on {options['host']}:{options['port']}, "
+                              f"CONTROL-C to quit.")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,250 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ArchivedMessage, ConversationReadState, CounselorAssignment, Message
+
+# Most recent messages shown on the chat page
+CHAT_HISTORY_LIMIT = 200
+# Cached read marks expire after a day. A mark the write interval held back
+# is only lost if the cache drops it first; the stored one is then a little
+# behind, never ahead.
+READ_MARK_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def conversation_filter(user, other):
+    return (Q(sender=user) & Q(receiver=other)) | (Q(sender=other) & Q(receiver=user))
+
+
+def conversation_history(user, other, limit=None):
+    """
+    Messages exchanged between two users, oldest first, read across the hot
+    Message table and the archive. Archived messages are always older than
+    hot ones, so the archive is only queried when the hot table doesn't
+    cover the requested window.
+    """
+    hot = Message.objects.filter(conversation_filter(user, other)).select_related('sender')
+    cold = ArchivedMessage.objects.filter(conversation_filter(user, other)).select_related('sender')
+
+    if limit is None:
+        return list(cold.order_by('timestamp', 'id')) + list(hot.order_by('timestamp', 'id'))
+
+    recent = list(hot.order_by('-timestamp', '-id')[:limit])
+    if len(recent) < limit:
+        recent += list(cold.order_by('-timestamp', '-id')[:limit - len(recent)])
+    recent.reverse()
+    return recent
+
+
+async def aconversation_history(user, other, limit=None):
+    """Async counterpart of conversation_history"""
+    hot = Message.objects.filter(conversation_filter(user, other)).select_related('sender')
+    cold = ArchivedMessage.objects.filter(conversation_filter(user, other)).select_related('sender')
+
+    if limit is None:
+        return ([m async for m in cold.order_by('timestamp', 'id')]
+                + [m async for m in hot.order_by('timestamp', 'id')])
+
+    recent = [m async for m in hot.order_by('-timestamp', '-id')[:limit]]
+    if len(recent) < limit:
+        recent += [m async for m in cold.order_by('-timestamp', '-id')[:limit - len(recent)]]
+    recent.reverse()
+    return recent
+
+
+def send_message(sender, receiver_id, content, client_id=None):
+    """
+    Store a message; returns (message, created). A message with a client_id
+    is stored once per sender: resending it returns the stored message
+    instead of a copy, so clients can retry a send whose answer they lost.
+    """
+    if client_id is None:
+        return _created(Message.objects.create(
+            sender=sender, receiver_id=receiver_id, content=content)), True
+    existing = Message.objects.filter(sender=sender, client_id=client_id).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=sender, receiver_id=receiver_id, content=content,
+                client_id=client_id)
+    except IntegrityError:
+        # A concurrent retry of the same message got in first
+        return Message.objects.get(sender=sender, client_id=client_id), False
+    return _created(message), True
+
+
+def _created(message):
+    key = _newest_key(message.sender_id, message.receiver_id)
+    transaction.on_commit(lambda: cache.delete(key))
+    return message
+
+
+def _newest_key(sender_id, receiver_id):
+    return f'chat-newest:{sender_id}:{receiver_id}'
+
+
+def newest_message_id(sender_id, receiver_id):
+    """Id of the newest message from sender to receiver, 0 if there is none"""
+    key = _newest_key(sender_id, receiver_id)
+    newest = cache.get(key)
+    if newest is None:
+        newest = 0
+        # Archived messages are older than hot ones
+        for model in (Message, ArchivedMessage):
+            newest = model.objects.filter(
+                sender_id=sender_id, receiver_id=receiver_id).aggregate(
+                newest=Max('id'))['newest'] or 0
+            if newest:
+                break
+        cache.set(key, newest, READ_MARK_CACHE_TIMEOUT)
+    return newest
+
+
+# Read receipts. A participant's read state is the id of the newest message
+# they have seen in the conversation. The current mark is kept in the cache
+# and written to ConversationReadState at most once per interval, so reading
+# adds no per-message writes.
+
+def _read_key(assignment_id, reader_id):
+    return f'chat-read:{assignment_id}:{reader_id}'
+
+
+def _stored_read_mark(assignment_id, reader_id):
+    return ConversationReadState.objects.filter(
+        assignment_id=assignment_id, reader_id=reader_id
+    ).values_list('last_read_message_id', flat=True).first() or 0
+
+
+def _write_read_mark(assignment_id, reader_id, message_id):
+    updated = ConversationReadState.objects.filter(
+        assignment_id=assignment_id, reader_id=reader_id,
+        last_read_message_id__lt=message_id,
+    ).update(last_read_message_id=message_id, updated_at=timezone.now())
+    if not updated:
+        try:
+            with transaction.atomic():
+                ConversationReadState.objects.create(
+                    assignment_id=assignment_id, reader_id=reader_id,
+                    last_read_message_id=message_id)
+        except IntegrityError:
+            # The row exists with a newer mark, or a concurrent request made it
+            pass
+
+
+def _read_state(assignment_id, reader_id):
+    """(mark, written to the database at) for a reader, primed from the database"""
+    key = _read_key(assignment_id, reader_id)
+    state = cache.get(key)
+    if state is None:
+        state = (_stored_read_mark(assignment_id, reader_id), 0.0)
+        cache.add(key, state, READ_MARK_CACHE_TIMEOUT)
+    return state
+
+
+def mark_read(assignment_id, reader_id, message_id):
+    """Move the reader's mark forward to `message_id`; returns the current mark"""
+    mark, written_at = _read_state(assignment_id, reader_id)
+    if message_id <= mark:
+        return mark
+    now = time.time()
+    if now - written_at >= getattr(settings, 'CHAT_READ_STATE_WRITE_INTERVAL', 30):
+        _write_read_mark(assignment_id, reader_id, message_id)
+        written_at = now
+    cache.set(_read_key(assignment_id, reader_id), (message_id, written_at),
+              READ_MARK_CACHE_TIMEOUT)
+    return message_id
+
+
+def read_mark(assignment_id, reader_id):
+    """Id of the newest message the reader has seen in the conversation"""
+    return _read_state(assignment_id, reader_id)[0]
+
+
+def cached_read_marks(pairs):
+    """
+    {(assignment id, reader id): mark} for the given pairs whose mark is in
+    the cache. Cached marks can be ahead of ConversationReadState.
+    """
+    keys = {_read_key(assignment_id, reader_id): (assignment_id, reader_id)
+            for assignment_id, reader_id in pairs}
+    return {keys[key]: state[0] for key, state in cache.get_many(list(keys)).items()}
+
+
+def update_receipts(assignment_id, reader_id, partner_id, history):
+    """
+    Mark the partner's messages in `history` as read by the reader and
+    return the id of the reader's newest message the partner has seen.
+    """
+    newest = max((m.id for m in history if m.sender_id == partner_id), default=0)
+    if newest:
+        mark_read(assignment_id, reader_id, newest)
+    partner_mark = read_mark(assignment_id, partner_id)
+    return max((m.id for m in history if m.sender_id == reader_id and m.id <= partner_mark),
+               default=None)
+
+
+# Typing indicators only ever live in the cache and expire on their own
+
+def _typing_key(assignment_id, user_id):
+    return f'chat-typing:{assignment_id}:{user_id}'
+
+
+def set_typing(assignment_id, user_id):
+    cache.set(_typing_key(assignment_id, user_id), True,
+              getattr(settings, 'CHAT_TYPING_TTL', 5))
+
+
+def is_typing(assignment_id, user_id):
+    return cache.get(_typing_key(assignment_id, user_id), False)
+
+
+# Offline sync. A client keeps a cursor, the id of the newest message it
+# holds; message ids only grow and the archive keeps them, so everything
+# newer than the cursor is the delta, fetched for all conversations at once.
+
+SYNC_FIELDS = ('id', 'sender_id', 'receiver_id', 'content', 'timestamp')
+
+
+def conversation_partners(user):
+    """
+    {partner id: assignment id} over the assignments `user` takes part in.
+    With several assignments to one partner the active, else the newest, wins.
+    """
+    rows = CounselorAssignment.objects.filter(
+        Q(user=user) | Q(counselor=user)).exclude(counselor=None).values_list(
+        'id', 'user_id', 'counselor_id', 'status')
+    partners = {}
+    for assignment_id, user_id, counselor_id, status in sorted(
+            rows, key=lambda row: (row[3] == 'active', row[0])):
+        partners[counselor_id if user_id == user.pk else user_id] = assignment_id
+    return partners
+
+
+def message_delta(user, since, since_by_partner=None, limit=200):
+    """
+    Messages sent or received by `user` after message id `since`, oldest
+    first, as tuples of SYNC_FIELDS plus client_id. `since_by_partner`
+    overrides the cursor for single conversations. Returns (rows, has_more).
+    """
+    since_by_partner = since_by_partner or {}
+    newer = Q(id__gt=since)
+    if since_by_partner:
+        newer &= ~Q(sender_id__in=since_by_partner) & ~Q(receiver_id__in=since_by_partner)
+    for partner_id, partner_since in since_by_partner.items():
+        newer |= Q(id__gt=partner_since) & (Q(sender_id=partner_id) | Q(receiver_id=partner_id))
+    condition = (Q(sender=user) | Q(receiver=user)) & newer
+
+    # Archived ids are all lower than hot ones; with a recent cursor the
+    # archive query is an empty primary key range
+    rows = [row + (None,) for row in ArchivedMessage.objects.filter(condition).order_by(
+        'id').values_list(*SYNC_FIELDS)[:limit + 1]]
+    if len(rows) <= limit:
+        rows += list(Message.objects.filter(condition).order_by('id').values_list(
+            *SYNC_FIELDS, 'client_id')[:limit + 1 - len(rows)])
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,96 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from . import ratelimit
+from .availability import get_zone
+
+TIMEZONE_SESSION_KEY = 'timezone'
+
+
+def _activate_zone(name):
+    if name:
+        timezone.activate(get_zone(name))
+    else:
+        timezone.deactivate()
+
+
+@sync_and_async_middleware
+class TimezoneMiddleware:
+    """
+    Activate the time zone saved in the session (a counselor's own zone, set
+    at login), so forms and templates work in local time. Runs natively in
+    both modes, so ASGI requests don't take a thread hop here.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        _activate_zone(request.session.get(TIMEZONE_SESSION_KEY))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        _activate_zone(await request.session.aget(TIMEZONE_SESSION_KEY))
+        return await self.get_response(request)
+
+
+@sync_and_async_middleware
+class RateLimitMiddleware:
+    """
+    Throttle POSTs to the views named in RATELIMIT_RULES with token buckets.
+    Runs before the view, so a rejected request never reaches password
+    hashing or a database write. Served async, only the store check of a
+    throttled route goes through sync_to_async.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django looks process_view up after __init__ and only adapts
+            # sync methods, which would cost a thread hop on every request
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        # In async mode this returns get_response's coroutine for the
+        # caller to await
+        return self.get_response(request)
+
+    def _rule_name(self, request):
+        if request.method != 'POST' or not getattr(settings, 'RATELIMIT_ENABLED', True):
+            return None
+        match = request.resolver_match
+        if match is None or match.url_name not in getattr(settings, 'RATELIMIT_RULES', {}):
+            return None
+        return match.url_name
+
+    def _throttled(self, retry_after):
+        if retry_after is None:
+            return None
+        response = HttpResponse(
+            'Too many requests. Please wait a moment and try again.',
+            status=429, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = self._rule_name(request)
+        if name is None:
+            return None
+        return self._throttled(ratelimit.check(request, name, view_kwargs))
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        name = self._rule_name(request)
+        if name is None:
+            return None
+        # The store and the account scope (request.user) are synchronous
+        return self._throttled(await sync_to_async(ratelimit.check)(request, name, view_kwargs))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_assignments_sessions_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counselorprofile',
+            name='document_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:58
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_counselorprofile_document_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='counselorprofile',
+            name='verification_document',
+            field=models.FileField(blank=True, null=True, storage=core.storage.get_document_storage, upload_to='verification_docs/'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:03
+
+import core.fields
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 500
+
+# (model, field, null). Turning a text column into a binary one in place is
+# only safe on SQLite: PostgreSQL's USING col::bytea reads backslashes in the
+# text as escapes. So each field gets a new binary column, the values are
+# copied over in Python, and the new column replaces the old one.
+COMPRESSED_FIELDS = [
+    ('Message', 'content', False),
+    ('ArchivedMessage', 'content', False),
+    ('CounselingSession', 'notes', True),
+    ('CounselorAssignment', 'notes', True),
+]
+
+
+def new_name(field_name):
+    return field_name + '_compressed'
+
+
+def copy_values(model, source, target):
+    last_pk = None
+    while True:
+        queryset = model.objects.order_by('pk').only('pk', source)
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        batch = list(queryset[:BATCH_SIZE])
+        if not batch:
+            break
+        for obj in batch:
+            # Compressed values are read back as str, text values are
+            # compressed on save
+            setattr(obj, target, getattr(obj, source))
+        with transaction.atomic():
+            model.objects.bulk_update(batch, [target])
+        last_pk = batch[-1].pk
+
+
+def compress_existing_rows(apps, schema_editor):
+    for model_name, field_name, _ in COMPRESSED_FIELDS:
+        copy_values(apps.get_model('core', model_name), field_name, new_name(field_name))
+
+
+def decompress_rows(apps, schema_editor):
+    for model_name, field_name, _ in COMPRESSED_FIELDS:
+        copy_values(apps.get_model('core', model_name), new_name(field_name), field_name)
+
+
+def add_compressed_columns():
+    return [
+        migrations.AddField(
+            model_name=model_name.lower(),
+            name=new_name(field_name),
+            field=core.fields.CompressedTextField(blank=True, editable=True, null=True),
+        )
+        for model_name, field_name, _ in COMPRESSED_FIELDS
+    ]
+
+
+def allow_null_text():
+    # So that on the way back the text column can be added empty and filled
+    # before it is made NOT NULL again
+    return [
+        migrations.AlterField(
+            model_name=model_name.lower(),
+            name=field_name,
+            field=models.TextField(blank=True, null=True),
+        )
+        for model_name, field_name, null in COMPRESSED_FIELDS if not null
+    ]
+
+
+def swap_columns():
+    operations = []
+    for model_name, field_name, null in COMPRESSED_FIELDS:
+        operations += [
+            migrations.RemoveField(model_name=model_name.lower(), name=field_name),
+            migrations.RenameField(
+                model_name=model_name.lower(), old_name=new_name(field_name), new_name=field_name),
+        ]
+        if not null:
+            operations.append(migrations.AlterField(
+                model_name=model_name.lower(),
+                name=field_name,
+                field=core.fields.CompressedTextField(editable=True),
+            ))
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    # Rows are copied in batches, each in its own transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_message_archive'),
+    ]
+
+    operations = [
+        *add_compressed_columns(),
+        *allow_null_text(),
+        migrations.RunPython(compress_existing_rows, decompress_rows),
+        *swap_columns(),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from core.search import get_backend
+
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.create_index(cursor)
+
+
+def drop_search_index(apps, schema_editor):
+    from core.search import get_backend
+
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_compress_text_fields'),
+    ]
+
+    # Existing rows are indexed with `python manage.py rebuild_search_index`
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
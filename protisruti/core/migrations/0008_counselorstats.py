@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounselorStats',
+            fields=[
+                ('counselor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='workload_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_assignments', models.IntegerField(default=0)),
+                ('upcoming_sessions', models.IntegerField(default=0)),
+                ('completed_sessions', models.IntegerField(default=0)),
+                ('weekly_available_minutes', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Counselor Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_counselorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=40)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('source', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='counselingsession',
+            index=models.Index(fields=['scheduled_time'], name='core_counse_schedul_2f3e8e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='counselingsession',
+            index=models.Index(fields=['updated_at'], name='core_counse_updated_e8cab1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='metricrollup',
+            constraint=models.UniqueConstraint(fields=('metric', 'granularity', 'bucket'), name='unique_metric_bucket'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_metric_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counselingsession',
+            name='occurrence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SessionSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('duration_minutes', models.PositiveIntegerField(default=60)),
+                ('interval_weeks', models.PositiveSmallIntegerField(choices=[(1, 'Weekly'), (2, 'Every two weeks')], default=1)),
+                ('until', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, null=True)),
+                ('materialized_count', models.PositiveIntegerField(default=0)),
+                ('next_occurrence', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='core.counselorassignment')),
+            ],
+            options={
+                'verbose_name_plural': 'Session series',
+            },
+        ),
+        migrations.AddField(
+            model_name='counselingsession',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='core.sessionseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='counselingsession',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence'), name='unique_series_occurrence'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:18
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+DAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday',
+             'friday', 'saturday', 'sunday')
+
+
+def normalize_availability(apps, schema_editor):
+    # Slots are now maximal free intervals: unavailable and empty rows go,
+    # overlapping or touching rows of the same day are merged into the
+    # first one, and the day name becomes its weekday number.
+    CounselorAvailability = apps.get_model('core', 'CounselorAvailability')
+    CounselorAvailability.objects.filter(is_available=False).delete()
+    CounselorAvailability.objects.filter(start_time__gte=models.F('end_time')).delete()
+
+    slots = CounselorAvailability.objects.order_by('counselor_id', 'day', 'start_time')
+    for _, group in groupby(list(slots), key=lambda slot: (slot.counselor_id, slot.day)):
+        current = None
+        for slot in group:
+            if current is not None and slot.start_time <= current.end_time:
+                if slot.end_time > current.end_time:
+                    current.end_time = slot.end_time
+                    current.save(update_fields=['end_time'])
+                slot.delete()
+            else:
+                current = slot
+
+    for number, name in enumerate(DAY_NAMES):
+        CounselorAvailability.objects.filter(day=name).update(day=str(number))
+
+
+def restore_day_names(apps, schema_editor):
+    CounselorAvailability = apps.get_model('core', 'CounselorAvailability')
+    for number, name in enumerate(DAY_NAMES):
+        CounselorAvailability.objects.filter(day=str(number)).update(day=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_calendar_feeds'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_availability, restore_day_names),
+        migrations.AlterUniqueTogether(
+            name='counseloravailability',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='counseloravailability',
+            name='day',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')]),
+        ),
+        migrations.AddConstraint(
+            model_name='counseloravailability',
+            constraint=models.UniqueConstraint(fields=('counselor', 'day', 'start_time'), name='unique_availability_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='counseloravailability',
+            constraint=models.CheckConstraint(condition=models.Q(('start_time__lt', models.F('end_time'))), name='availability_start_before_end'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+# Case-insensitive indexes for the admin's prefix search ('^' search fields).
+# SQLite matches LIKE 'x%' against a NOCASE index; PostgreSQL compares
+# UPPER(column::text) LIKE UPPER('x%'), which a text_pattern_ops index on
+# the same expression serves. Other backends go without.
+NOCASE_INDEXES = [
+    ('user', 'email', 'user_email_nocase'),
+    ('userprofile', 'full_name', 'userprofile_name_nocase'),
+    ('counselorprofile', 'full_name', 'counselorprofile_name_nocase'),
+]
+
+
+def create_nocase_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    quote = schema_editor.quote_name
+    for model_name, column, name in NOCASE_INDEXES:
+        table = quote(apps.get_model('core', model_name)._meta.db_table)
+        if vendor == 'sqlite':
+            expression = f'{quote(column)} COLLATE NOCASE'
+        elif vendor == 'postgresql':
+            expression = f'(UPPER({quote(column)}::text)) text_pattern_ops'
+        else:
+            continue
+        schema_editor.execute(f'CREATE INDEX {quote(name)} ON {table} ({expression})')
+
+
+def drop_nocase_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    for _, _, name in NOCASE_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0013_counselor_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='core_user_date_jo_a935f6_idx'),
+        ),
+        migrations.RunPython(create_nocase_indexes, drop_nocase_indexes),
+    ]
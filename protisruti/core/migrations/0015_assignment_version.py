@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='counselorassignment',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='counselorassignment',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='counselorassignment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('counselor', 'user'), name='unique_active_assignment', violation_error_message='This user already has an active assignment with this counselor.'),
+        ),
+    ]
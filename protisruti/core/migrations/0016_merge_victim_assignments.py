@@ -0,0 +1,103 @@
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+STAT_FIELDS = ('active_assignments', 'upcoming_sessions',
+               'completed_sessions', 'weekly_available_minutes')
+
+
+def merge_victim_assignments(apps, schema_editor):
+    # Every VictimCounselorAssignment becomes an active CounselorAssignment
+    # between the two users, unless that pair already has an active one.
+    # Rows are read in primary key batches so memory stays flat.
+    VictimCounselorAssignment = apps.get_model('core', 'VictimCounselorAssignment')
+    CounselorAssignment = apps.get_model('core', 'CounselorAssignment')
+    CounselorStats = apps.get_model('core', 'CounselorStats')
+
+    touched = set()
+    last_pk = 0
+    while True:
+        batch = list(VictimCounselorAssignment.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .values_list('pk', 'victim_id', 'counselor__user_id', 'assigned_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        pairs = {(counselor_id, user_id) for _, user_id, counselor_id, _ in batch}
+        existing = set(CounselorAssignment.objects.filter(
+            status='active',
+            user_id__in={user_id for _, user_id in pairs},
+            counselor_id__in={counselor_id for counselor_id, _ in pairs},
+        ).values_list('counselor_id', 'user_id'))
+
+        new = {}
+        for _, user_id, counselor_id, assigned_at in batch:
+            if (counselor_id, user_id) not in existing and (counselor_id, user_id) not in new:
+                new[counselor_id, user_id] = CounselorAssignment(
+                    counselor_id=counselor_id, user_id=user_id, status='active')
+                new[counselor_id, user_id].merged_assigned_at = assigned_at
+        created = CounselorAssignment.objects.bulk_create(new.values())
+        # assigned_date is auto_now_add; carry the original date over afterwards
+        for assignment in created:
+            assignment.assigned_date = assignment.merged_assigned_at
+        CounselorAssignment.objects.bulk_update(created, ['assigned_date'], batch_size=BATCH_SIZE)
+        touched.update(counselor_id for counselor_id, _ in new)
+
+    # bulk_create skips the signals that keep the workload stats current.
+    # Counselors whose only assignments came from the merge have no stats
+    # row yet, so every number is computed (as reconcile_all_stats does) and
+    # the rows are created or overwritten.
+    write_stats(apps, touched)
+
+
+def write_stats(apps, counselor_ids):
+    CounselingSession = apps.get_model('core', 'CounselingSession')
+    CounselorAssignment = apps.get_model('core', 'CounselorAssignment')
+    CounselorAvailability = apps.get_model('core', 'CounselorAvailability')
+    CounselorStats = apps.get_model('core', 'CounselorStats')
+
+    now = timezone.now()
+    computed = {pk: dict.fromkeys(STAT_FIELDS, 0) for pk in counselor_ids}
+
+    def merge(field, rows):
+        for counselor_id, value in rows:
+            computed[counselor_id][field] = value
+
+    merge('active_assignments', CounselorAssignment.objects.filter(
+        counselor_id__in=computed, status='active'
+    ).values_list('counselor_id').annotate(n=Count('pk')).order_by())
+    sessions = CounselingSession.objects.filter(
+        assignment__counselor_id__in=computed).values_list('assignment__counselor_id')
+    merge('upcoming_sessions', sessions.filter(status='scheduled', scheduled_time__gte=now)
+          .annotate(n=Count('pk')).order_by())
+    merge('completed_sessions', sessions.filter(status='completed')
+          .annotate(n=Count('pk')).order_by())
+    for counselor_id, start, end in CounselorAvailability.objects.filter(
+            counselor_id__in=computed, is_available=True).values_list(
+            'counselor_id', 'start_time', 'end_time'):
+        computed[counselor_id]['weekly_available_minutes'] += (
+            (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute))
+
+    CounselorStats.objects.bulk_create(
+        [CounselorStats(counselor_id=pk, updated_at=now, **values)
+         for pk, values in computed.items()],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['counselor'],
+        update_fields=list(STAT_FIELDS) + ['updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_assignment_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_victim_assignments, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='VictimCounselorAssignment',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_message_client_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_id', models.BigIntegerField(default=0)),
+                ('sessions_until', models.DateTimeField(blank=True, null=True)),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('recipient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='digest_state', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
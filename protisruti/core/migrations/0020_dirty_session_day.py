@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_digest_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtySessionDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_time', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,11 +1,13 @@
-from django.db import models
+from django.db import DatabaseError, models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.db import models
-from django.contrib import admin
 from django.conf import settings
 
+from .fields import CompressedTextField
+from .storage import get_document_storage
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -57,6 +59,13 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        # The admin's case-insensitive prefix search (LIKE 'x%') is served by
+        # per-backend expression indexes, see migration 0014
+        indexes = [
+            models.Index(fields=['date_joined']),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -115,7 +124,13 @@ class CounselorProfile(models.Model):
     verification_status = models.CharField(
         max_length=10, choices=VERIFICATION_STATUS, default='pending')
     verification_document = models.FileField(
-        upload_to='verification_docs/', null=True, blank=True)
+        upload_to='verification_docs/', storage=get_document_storage,
+        null=True, blank=True)
+    document_sha256 = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False)
+    timezone = models.CharField(max_length=64, default='UTC')
+    availability_projected_until = models.DateTimeField(
+        null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -123,40 +138,96 @@ class CounselorProfile(models.Model):
         return f"Counselor: {self.full_name}"
 
 
+class DocumentBlob(models.Model):
+    """
+    Reference count for a content-addressed verification document file
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
 # Add these models to core/models.py
 
 class CounselorAvailability(models.Model):
     """
-    Model to track counselor availability for sessions
+    Weekly availability of a counselor. Rows are kept normalized by
+    core.availability: per counselor and weekday the intervals never overlap
+    or touch, so each row is a maximal free interval.
     """
     DAY_CHOICES = (
-        ('monday', 'Monday'),
-        ('tuesday', 'Tuesday'),
-        ('wednesday', 'Wednesday'),
-        ('thursday', 'Thursday'),
-        ('friday', 'Friday'),
-        ('saturday', 'Saturday'),
-        ('sunday', 'Sunday'),
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
     )
+    DAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday',
+                 'friday', 'saturday', 'sunday')
 
     counselor = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='availabilities')
-    day = models.CharField(max_length=10, choices=DAY_CHOICES)
+    day = models.PositiveSmallIntegerField(choices=DAY_CHOICES)
     start_time = models.TimeField()
     end_time = models.TimeField()
     is_available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('counselor', 'day', 'start_time', 'end_time')
         verbose_name_plural = 'Counselor Availabilities'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['counselor', 'day', 'start_time'], name='unique_availability_start'),
+            models.CheckConstraint(
+                condition=models.Q(start_time__lt=models.F('end_time')),
+                name='availability_start_before_end'),
+        ]
 
     def __str__(self):
         return f"{self.counselor.counselor_profile.full_name} - {self.get_day_display()} ({self.start_time} - {self.end_time})"
 
+    @property
+    def day_name(self):
+        return self.DAY_NAMES[self.day]
+
+
+class AvailabilityWindow(models.Model):
+    """
+    A counselor's weekly availability projected onto concrete UTC intervals
+    for the upcoming weeks, in the counselor's time zone. Rebuilt by
+    core.availability whenever the availability or the time zone changes.
+    """
+    counselor = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='availability_windows')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['counselor', 'start']),
+        ]
+
+    def __str__(self):
+        return f"{self.counselor_id}: {self.start} - {self.end}"
+
+
+class ConcurrentUpdateError(DatabaseError):
+    """A versioned row was changed by someone else since it was loaded"""
+
 
 class CounselorAssignment(models.Model):
     """
-    Model to track assignment of users to counselors
+    Model to track assignment of users to counselors.
+
+    Saves use optimistic locking: the UPDATE only matches the version the
+    instance was loaded with and increments it, so a concurrent change makes
+    save() raise ConcurrentUpdateError instead of being overwritten.
     """
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -172,11 +243,19 @@ class CounselorAssignment(models.Model):
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES, default='active')
     assigned_date = models.DateTimeField(auto_now_add=True)
-    notes = models.TextField(blank=True, null=True)
+    notes = CompressedTextField(blank=True, null=True)
     last_session = models.DateTimeField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
-        unique_together = ('counselor', 'user', 'status')
+        constraints = [
+            # Any number of past assignments, but only one active one per pair
+            models.UniqueConstraint(
+                fields=['counselor', 'user'], condition=models.Q(status='active'),
+                name='unique_active_assignment',
+                violation_error_message='This user already has an active assignment '
+                                        'with this counselor.'),
+        ]
 
     def __str__(self):
         return f"{self.user.user_profile.full_name} assigned to {self.counselor.counselor_profile.full_name}"
@@ -184,6 +263,19 @@ class CounselorAssignment(models.Model):
     def is_active(self):
         return self.status == 'active'
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        version = self.version
+        values = [value for value in values if value[0].attname != 'version']
+        values.append((self._meta.get_field('version'), None, version + 1))
+        if not super()._do_update(base_qs.filter(version=version), using, pk_val,
+                                  values, update_fields, forced_update):
+            if base_qs.filter(pk=pk_val).exists():
+                raise ConcurrentUpdateError(
+                    f"Assignment {pk_val} was changed since version {version} was loaded.")
+            return False
+        self.version = version + 1
+        return True
+
 
 class CounselingSession(models.Model):
     """
@@ -199,14 +291,28 @@ class CounselingSession(models.Model):
 
     assignment = models.ForeignKey(
         CounselorAssignment, on_delete=models.CASCADE, related_name='sessions')
+    series = models.ForeignKey(
+        'SessionSeries', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='sessions')
+    occurrence = models.PositiveIntegerField(null=True, blank=True)
     scheduled_time = models.DateTimeField()
     duration_minutes = models.PositiveIntegerField(default=60)
     status = models.CharField(
         max_length=11, choices=STATUS_CHOICES, default='scheduled')
-    notes = models.TextField(blank=True, null=True)
+    notes = CompressedTextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['scheduled_time']),
+            models.Index(fields=['updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['series', 'occurrence'], name='unique_series_occurrence'),
+        ]
+
     def __str__(self):
         return f"Session: {self.assignment.user.user_profile.full_name} with {self.assignment.counselor.counselor_profile.full_name} on {self.scheduled_time}"
 
@@ -214,22 +320,120 @@ class CounselingSession(models.Model):
         return self.status == 'scheduled' and self.scheduled_time > timezone.now()
 
 
-class VictimCounselorAssignment(models.Model):
-    victim = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='assignments')
-    counselor = models.ForeignKey(
-        CounselorProfile, on_delete=models.CASCADE, related_name='assignments')
-    assigned_at = models.DateTimeField(auto_now_add=True)
+class SessionSeries(models.Model):
+    """
+    Weekly or biweekly recurring sessions. Occurrences are created as
+    CounselingSession rows a few weeks ahead by the materialize_sessions
+    command; next_occurrence is the first one not created yet.
+    """
+    INTERVAL_CHOICES = (
+        (1, 'Weekly'),
+        (2, 'Every two weeks'),
+    )
+
+    assignment = models.ForeignKey(
+        CounselorAssignment, on_delete=models.CASCADE, related_name='series')
+    start_time = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField(default=60)
+    interval_weeks = models.PositiveSmallIntegerField(
+        choices=INTERVAL_CHOICES, default=1)
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    materialized_count = models.PositiveIntegerField(default=0)
+    next_occurrence = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Session series'
+
+    def __str__(self):
+        return f"{self.get_interval_weeks_display()} from {self.start_time}"
+
+
+class CounselorStats(models.Model):
+    """
+    Materialized workload numbers per counselor, kept current by signals in
+    core/signals.py and reconciled by `refresh_counselor_stats`
+    """
+    counselor = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='workload_stats')
+    active_assignments = models.IntegerField(default=0)
+    upcoming_sessions = models.IntegerField(default=0)
+    completed_sessions = models.IntegerField(default=0)
+    weekly_available_minutes = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Counselor Stats'
+
+    def __str__(self):
+        return f"Stats for {self.counselor_id}"
+
+    @property
+    def weekly_available_hours(self):
+        return round(self.weekly_available_minutes / 60, 1)
+
+
+class CalendarFeedToken(models.Model):
+    """
+    Secret token in the URL of a user's iCalendar feed. Regenerating it
+    revokes the old URL.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendar feed of {self.user.email}"
+
+
+class MetricRollup(models.Model):
+    """
+    Pre-aggregated count for one metric in one hourly or daily bucket,
+    filled incrementally by the rollup_metrics command
+    """
+    GRANULARITY_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    metric = models.CharField(max_length=40)
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['metric', 'granularity', 'bucket'], name='unique_metric_bucket'),
+        ]
 
     def __str__(self):
-        return f"{self.victim} assigned to {self.counselor}"
+        return f"{self.metric} {self.granularity} {self.bucket}: {self.value}"
 
 
-@admin.register(VictimCounselorAssignment)
-class VictimCounselorAssignmentAdmin(admin.ModelAdmin):
-    list_display = ('victim', 'counselor', 'assigned_at')
-    search_fields = ('victim__email', 'counselor__user__email')
-    list_filter = ('assigned_at',)
+class RollupWatermark(models.Model):
+    """How far rollup_metrics has processed a source table"""
+    source = models.CharField(max_length=40, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    last_updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.last_id}"
+
+
+class DirtySessionDay(models.Model):
+    """
+    The old scheduled time of a session that was moved or deleted. Its
+    daily bucket no longer shows up among the changed sessions, so
+    rollup_sessions recomputes it from here and deletes the row.
+    """
+    scheduled_time = models.DateTimeField()
+
+    def __str__(self):
+        return f"Dirty session day {self.scheduled_time:%Y-%m-%d}"
 
 
 class Message(models.Model):
@@ -237,8 +441,83 @@ class Message(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_messages')
-    content = models.TextField()
+    content = CompressedTextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Generated by the sending client so a retried send can be recognised
+    client_id = models.UUIDField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sender', 'client_id'], name='unique_message_client_id'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.email} to {self.receiver.email} at {self.timestamp}"
+
+
+class ConversationReadState(models.Model):
+    """
+    How far a participant has read the conversation of an assignment: a
+    high-water mark over message ids instead of a flag on every message.
+    Written by core.messaging.mark_read at most once per
+    CHAT_READ_STATE_WRITE_INTERVAL; newer marks live in the cache until then.
+    """
+    assignment = models.ForeignKey(
+        CounselorAssignment, on_delete=models.CASCADE, related_name='read_states')
+    reader = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['assignment', 'reader'], name='unique_read_state'),
+        ]
+
+    def __str__(self):
+        return f"{self.reader_id} read assignment {self.assignment_id} up to {self.last_read_message_id}"
+
+
+class DigestState(models.Model):
+    """
+    What the last notification digest covered for a recipient, so the next
+    one only reports what is new: messages after last_message_id and
+    sessions after sessions_until or changed since last_sent_at. Maintained
+    by core.digests.
+    """
+    recipient = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='digest_state')
+    last_message_id = models.BigIntegerField(default=0)
+    sessions_until = models.DateTimeField(null=True, blank=True)
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Digest state of {self.recipient_id}"
+
+
+class ArchivedMessage(models.Model):
+    """
+    Cold storage for messages older than MESSAGE_ARCHIVE_AFTER_DAYS, moved
+    here by the archive_messages command. Keeps the original message id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    receiver = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    content = CompressedTextField()
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"Archived message from {self.sender_id} to {self.receiver_id} at {self.timestamp}"
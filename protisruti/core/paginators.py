@@ -0,0 +1,51 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 10_000
+# Filtered changelists count at most this many matches
+FILTERED_COUNT_LIMIT = 10_000
+
+
+def estimated_count(model, using='default'):
+    """
+    Row count of a table from the planner statistics (pg_class on
+    PostgreSQL, sqlite_stat1 after ANALYZE on SQLite), or None when the
+    database has none.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    except DatabaseError:
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables. An unfiltered list uses
+    the estimated table size instead of COUNT(*); a filtered or searched one
+    counts the matches up to FILTERED_COUNT_LIMIT, so the page count stops
+    there rather than scanning every match.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset.order_by()[:FILTERED_COUNT_LIMIT].count()
+        estimate = estimated_count(queryset.model, queryset.db)
+        if estimate is None or estimate < ESTIMATE_THRESHOLD:
+            return queryset.count()
+        return estimate
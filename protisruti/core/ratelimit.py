@@ -0,0 +1,195 @@
+import math
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+def _refill(tokens, updated, capacity, period, now):
+    return min(capacity, tokens + max(now - updated, 0) * capacity / period)
+
+
+def _decide(levels, buckets):
+    """
+    (allowed, seconds to wait) for the current token levels of the buckets
+    of one request. Tokens are only taken when every bucket has one.
+    """
+    wait = max(((1 - tokens) * period / capacity
+                for tokens, (_, capacity, period) in zip(levels, buckets) if tokens < 1),
+               default=0)
+    return wait == 0, wait
+
+
+class MemoryStore:
+    """Token buckets of one process, guarded by a lock"""
+
+    max_keys = 100_000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, buckets, now=None):
+        """
+        Take one token from each of `buckets`, a list of (key, capacity,
+        period), or from none of them when one is empty. Returns (allowed,
+        seconds until every bucket has a token).
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            levels = []
+            for key, capacity, period in buckets:
+                tokens, updated, _ = self.buckets.get(key, (capacity, now, now))
+                levels.append(_refill(tokens, updated, capacity, period, now))
+            allowed, wait = _decide(levels, buckets)
+            for tokens, (key, capacity, period) in zip(levels, buckets):
+                tokens -= allowed
+                self.buckets[key] = (tokens, now, now + (capacity - tokens) * period / capacity)
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, wait
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+
+    def purge(self, older_than=None):
+        """Drop the buckets that are full again; each knows when that is"""
+        with self.lock:
+            count = len(self.buckets)
+            self._prune(time.monotonic())
+            return count - len(self.buckets)
+
+
+class SQLiteStore:
+    """
+    Token buckets shared by all worker processes on a host through a small
+    SQLite file, kept apart from the main database so throttling never
+    competes with its writer lock. BEGIN IMMEDIATE makes the read and the
+    update of a request's buckets one atomic step.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self.local.connection = connection
+        return connection
+
+    def consume(self, buckets, now=None):
+        now = time.time() if now is None else now
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, capacity, period in buckets:
+                row = connection.execute(
+                    'SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                levels.append(_refill(tokens, updated, capacity, period, now))
+            allowed, wait = _decide(levels, buckets)
+            connection.executemany(
+                'INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, '
+                'updated = excluded.updated',
+                [(key, tokens - allowed, now) for tokens, (key, _, _) in zip(levels, buckets)])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, wait
+
+    def purge(self, older_than):
+        """Drop buckets untouched for `older_than` seconds (they are full again)"""
+        connection = self.connection()
+        return connection.execute(
+            'DELETE FROM bucket WHERE updated < ?', (time.time() - older_than,)).rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if getattr(settings, 'RATELIMIT_STORE', 'memory') == 'sqlite':
+                    _store = SQLiteStore(settings.RATELIMIT_SQLITE_PATH)
+                else:
+                    _store = MemoryStore()
+    return _store
+
+
+def client_ip(request):
+    if getattr(settings, 'RATELIMIT_TRUST_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def scope_key(scope, request, view_kwargs):
+    """Bucket key of a scope for the request, None when it doesn't apply"""
+    if scope == 'ip':
+        return client_ip(request)
+    if scope == 'account':
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        # Login and registration posts name the account they target
+        account = request.POST.get('username') or request.POST.get('email')
+        return account.strip().lower() if account else None
+    if scope == 'conversation':
+        if not request.user.is_authenticated or not view_kwargs:
+            return None
+        other = ':'.join(str(value) for _, value in sorted(view_kwargs.items()))
+        return f'{request.user.pk}:{other}'
+    raise ValueError(f'Unknown rate limit scope {scope!r}')
+
+
+def longest_period():
+    return max((period for rule in getattr(settings, 'RATELIMIT_RULES', {}).values()
+                for _, period in rule.values()), default=0)
+
+
+def maybe_purge(store):
+    """
+    Now and then drop the buckets that have refilled completely, so the
+    store doesn't keep one row per client ever seen
+    """
+    if random.random() < getattr(settings, 'RATELIMIT_PURGE_PROBABILITY', 0.001):
+        store.purge(longest_period())
+
+
+def check(request, name, view_kwargs=None):
+    """
+    Consume a token from every bucket of the named rule, or from none when
+    one of them is empty. Returns None when the request may go on,
+    otherwise the seconds to wait before retrying.
+    """
+    rule = getattr(settings, 'RATELIMIT_RULES', {}).get(name)
+    if not rule:
+        return None
+    buckets = []
+    for scope, (capacity, period) in rule.items():
+        key = scope_key(scope, request, view_kwargs)
+        if key is not None:
+            buckets.append((f'{name}:{scope}:{key}', capacity, period))
+    if not buckets:
+        return None
+    store = get_store()
+    maybe_purge(store)
+    allowed, wait = store.consume(buckets)
+    return None if allowed else max(math.ceil(wait), 1)
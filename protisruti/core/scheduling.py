@@ -0,0 +1,237 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .availability import counselor_zone, windows_between
+from .models import CounselingSession, DirtySessionDay, SessionSeries
+from .workload import refresh_counselor_stats
+
+SERIES_MAX_OCCURRENCES = 104
+
+
+def window_end():
+    """How far ahead series occurrences exist as CounselingSession rows"""
+    return timezone.now() + timedelta(weeks=getattr(settings, 'SESSION_SERIES_WINDOW_WEEKS', 8))
+
+
+def occurrence_time(start_time, interval_weeks, index, zone=None):
+    """
+    Occurrences keep the wall clock time of the first one in the counselor's
+    time zone, so the step is added to the local time rather than to the UTC
+    instant.
+    """
+    local = start_time.astimezone(zone) if zone else timezone.localtime(start_time)
+    shifted = local.replace(tzinfo=None) + timedelta(weeks=interval_weeks * index)
+    return timezone.make_aware(shifted, local.tzinfo)
+
+
+def occurrences(start_time, interval_weeks, until=None, count=None, first=0, zone=None):
+    """Yield (index, datetime) pairs from occurrence `first` to the end of the series"""
+    index = first
+    while count is None or index < count:
+        when = occurrence_time(start_time, interval_weeks, index, zone)
+        if until and when.astimezone(zone or timezone.get_current_timezone()).date() > until:
+            return
+        if index >= SERIES_MAX_OCCURRENCES:
+            return
+        yield index, when
+        index += 1
+
+
+def series_occurrences(series, first=0, zone=None):
+    return occurrences(series.start_time, series.interval_weeks,
+                       series.until, series.count, first, zone)
+
+
+def find_conflicts(counselor, times, duration_minutes, exclude_series=None):
+    """
+    Check every occurrence of a series in one pass: one range lookup of the
+    projected availability windows and one query for the counselor's
+    scheduled sessions over the whole span, plus the not yet materialized
+    occurrences of their other series. Returns the list of problems as
+    strings.
+    """
+    if not times:
+        return []
+    duration = timedelta(minutes=duration_minutes)
+    zone = counselor_zone(counselor.pk)
+
+    # Availability comes from the counselor's projected UTC windows, which
+    # already account for their time zone and DST
+    problems = []
+    windows = windows_between(counselor.pk, times[0], times[-1] + duration)
+    window_starts = [start for start, _ in windows]
+    for when in times:
+        position = bisect_right(window_starts, when) - 1
+        if position < 0 or windows[position][1] < when + duration:
+            problems.append(
+                f"The counselor is not available at {when.astimezone(zone):%b %d, %Y %H:%M}")
+
+    span_start, span_end = times[0] - timedelta(days=1), times[-1] + duration
+    sessions = CounselingSession.objects.filter(
+        assignment__counselor=counselor,
+        status='scheduled',
+        scheduled_time__gte=span_start,
+        scheduled_time__lt=span_end
+    )
+    if exclude_series is not None:
+        sessions = sessions.exclude(series=exclude_series)
+    busy = [(start, start + timedelta(minutes=minutes))
+            for start, minutes in sessions.values_list('scheduled_time', 'duration_minutes')]
+
+    other_series = SessionSeries.objects.filter(
+        assignment__counselor=counselor,
+        next_occurrence__lt=span_end
+    )
+    if exclude_series is not None:
+        other_series = other_series.exclude(pk=exclude_series.pk)
+    for series in other_series:
+        length = timedelta(minutes=series.duration_minutes)
+        for _, when in series_occurrences(series, series.materialized_count, zone):
+            if when >= span_end:
+                break
+            busy.append((when, when + length))
+
+    # Merge the busy intervals, then a single sweep over both sorted lists
+    # finds the overlapping occurrences
+    merged = []
+    for start, end in sorted(busy):
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    position = 0
+    for when in times:
+        while position < len(merged) and merged[position][1] <= when:
+            position += 1
+        if position < len(merged) and merged[position][0] < when + duration:
+            problems.append(
+                f"The counselor already has a session at {when.astimezone(zone):%b %d, %Y %H:%M}")
+    return problems
+
+
+def materialize(series, horizon=None):
+    """Create the sessions of a series up to the horizon (default: the rolling window)"""
+    horizon = horizon or window_end()
+    with transaction.atomic():
+        series = SessionSeries.objects.select_for_update().select_related(
+            'assignment').get(pk=series.pk)
+        zone = counselor_zone(series.assignment.counselor_id)
+        new_sessions = []
+        next_occurrence = None
+        for index, when in series_occurrences(series, series.materialized_count, zone):
+            if when > horizon:
+                next_occurrence = when
+                break
+            new_sessions.append(CounselingSession(
+                assignment_id=series.assignment_id,
+                series=series,
+                occurrence=index,
+                scheduled_time=when,
+                duration_minutes=series.duration_minutes,
+            ))
+
+        CounselingSession.objects.bulk_create(new_sessions, ignore_conflicts=True)
+        series.materialized_count += len(new_sessions)
+        series.next_occurrence = next_occurrence
+        series.save(update_fields=['materialized_count', 'next_occurrence', 'updated_at'])
+
+        if new_sessions and series.assignment.counselor_id:
+            refresh_counselor_stats(series.assignment.counselor_id)
+    return len(new_sessions)
+
+
+def materialize_due(horizon=None):
+    """Extend every series whose next occurrence falls inside the window"""
+    horizon = horizon or window_end()
+    created = 0
+    for series in SessionSeries.objects.filter(next_occurrence__lte=horizon).iterator():
+        created += materialize(series, horizon)
+    return created
+
+
+def create_series(assignment, start_time, duration_minutes, interval_weeks,
+                  until=None, count=None):
+    with transaction.atomic():
+        series = SessionSeries.objects.create(
+            assignment=assignment,
+            start_time=start_time,
+            duration_minutes=duration_minutes,
+            interval_weeks=interval_weeks,
+            until=until,
+            count=count,
+            next_occurrence=start_time,
+        )
+        materialize(series)
+    return series
+
+
+def split_series(session, new_time, duration_minutes):
+    """
+    Apply an edit to `session` and every later occurrence of its series.
+
+    The series is cut at the session: the old one keeps the earlier
+    occurrences and a new one takes over from the session onwards. Later
+    sessions move to the new series; the ones still scheduled get the new
+    duration and their occurrence's time in the new series, computed in the
+    counselor's zone so times past a DST change keep their wall clock time.
+    Completed, missed and cancelled sessions keep their times.
+    """
+    cut = session.occurrence
+    with transaction.atomic():
+        series = SessionSeries.objects.select_for_update().select_related(
+            'assignment').get(pk=session.series_id)
+        zone = counselor_zone(series.assignment.counselor_id)
+
+        new_series = SessionSeries.objects.create(
+            assignment=series.assignment,
+            start_time=new_time,
+            duration_minutes=duration_minutes,
+            interval_weeks=series.interval_weeks,
+            until=series.until,
+            count=series.count - cut if series.count is not None else None,
+            materialized_count=max(series.materialized_count - cut, 0),
+        )
+        new_series.next_occurrence = next(
+            (when for _, when in series_occurrences(
+                new_series, new_series.materialized_count, zone)),
+            None)
+        new_series.save(update_fields=['next_occurrence'])
+
+        later = series.sessions.filter(occurrence__gte=cut)
+        scheduled = list(later.filter(status='scheduled').only(
+            'pk', 'occurrence', 'scheduled_time', 'duration_minutes'))
+        later.update(series=new_series, occurrence=F('occurrence') - cut)
+
+        now = timezone.now()
+        moved = []
+        for moving in scheduled:
+            old_time = moving.scheduled_time
+            moving.scheduled_time = occurrence_time(
+                new_time, new_series.interval_weeks, moving.occurrence - cut, zone)
+            moving.duration_minutes = duration_minutes
+            moving.updated_at = now
+            if moving.scheduled_time != old_time:
+                moved.append(DirtySessionDay(scheduled_time=old_time))
+        CounselingSession.objects.bulk_update(
+            scheduled, ['scheduled_time', 'duration_minutes', 'updated_at'], batch_size=500)
+        # bulk_update skips the signals that keep the session rollups right
+        DirtySessionDay.objects.bulk_create(moved)
+
+        if cut == 0:
+            series.delete()
+        else:
+            series.count = cut
+            series.materialized_count = min(series.materialized_count, cut)
+            series.next_occurrence = None
+            series.save(update_fields=['count', 'materialized_count', 'next_occurrence',
+                                       'updated_at'])
+
+        if series.assignment.counselor_id:
+            refresh_counselor_stats(series.assignment.counselor_id)
+    return new_series
@@ -0,0 +1,249 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# One row per searchable object. The row id encodes kind and object id so
+# index updates are primary key lookups on both backends.
+KINDS = {'message': 0, 'session': 1}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+TABLE = 'core_searchindex'
+
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def row_id(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+def split_row_id(rowid):
+    return KIND_NAMES[rowid % len(KINDS)], rowid // len(KINDS)
+
+
+def highlight(snippet):
+    """Escape a backend snippet and turn the match markers into <mark> tags"""
+    return mark_safe(
+        escape(snippet)
+        .replace(SNIPPET_START, '<mark>')
+        .replace(SNIPPET_END, '</mark>')
+    )
+
+
+class SQLiteBackend:
+    """FTS5 virtual table; participants are indexed as `u<id>` tokens"""
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "body, scope, tokenize='porter unicode61')"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(r[0],) for r in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, body, scope) VALUES (%s, %s, %s)",
+            [(rowid, body, ' '.join(f'u{p}' for p in participants))
+             for rowid, body, participants in rows],
+        )
+
+    def delete(self, cursor, rowid):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid])
+
+    def match_expression(self, user_id, query):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = ['body : "%s"' % token for token in tokens[:-1]]
+        terms.append('body : "%s"*' % tokens[-1])
+        return 'scope : "u%d" AND %s' % (user_id, ' AND '.join(terms))
+
+    def search(self, cursor, user_id, query, limit, offset):
+        expression = self.match_expression(user_id, query)
+        if expression is None:
+            return []
+        cursor.execute(
+            f"SELECT rowid, snippet({TABLE}, 0, %s, %s, '…', 16), bm25({TABLE}) "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s "
+            f"ORDER BY bm25({TABLE}) LIMIT %s OFFSET %s",
+            [SNIPPET_START, SNIPPET_END, expression, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class PostgreSQLBackend:
+    """Table with a generated tsvector column and GIN indexes"""
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            "id bigint PRIMARY KEY, "
+            "participants bigint[] NOT NULL, "
+            "body text NOT NULL, "
+            "tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', body)) STORED)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {TABLE}_tsv ON {TABLE} USING GIN (tsv)")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE}_participants ON {TABLE} USING GIN (participants)")
+
+    def drop_index(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (id, body, participants) VALUES (%s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET body = EXCLUDED.body, "
+            "participants = EXCLUDED.participants",
+            [(rowid, body, list(participants)) for rowid, body, participants in rows],
+        )
+
+    def delete(self, cursor, rowid):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE id = %s", [rowid])
+
+    def search(self, cursor, user_id, query, limit, offset):
+        cursor.execute(
+            "SELECT id, ts_headline('english', body, q, %s), ts_rank(tsv, q) AS rank "
+            f"FROM {TABLE}, websearch_to_tsquery('english', %s) q "
+            "WHERE tsv @@ q AND participants @> ARRAY[%s]::bigint[] "
+            "ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s",
+            [f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=30, MinWords=10',
+             query, user_id, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend(db_connection=connection):
+    backend_class = BACKENDS.get(db_connection.vendor)
+    return backend_class() if backend_class else None
+
+
+def index_message(message):
+    _upsert([(row_id('message', message.pk), message.content,
+              (message.sender_id, message.receiver_id))])
+
+
+def index_session(session):
+    rowid = row_id('session', session.pk)
+    if not session.notes:
+        remove(rowid)
+        return
+    assignment = session.assignment
+    participants = [p for p in (assignment.user_id, assignment.counselor_id) if p]
+    _upsert([(rowid, session.notes, participants)])
+
+
+def remove(rowid):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, rowid)
+
+
+def _upsert(rows):
+    backend = get_backend()
+    if backend is not None and rows:
+        with connection.cursor() as cursor:
+            backend.upsert(cursor, rows)
+
+
+def search(user, query, page=1, per_page=20):
+    """
+    Ranked search over the messages and session notes the user takes part
+    in. Returns a list of dicts with kind, object and highlighted snippet.
+    """
+    backend = get_backend()
+    if backend is None or not query.strip():
+        return []
+
+    with connection.cursor() as cursor:
+        hits = backend.search(cursor, user.pk, query, per_page, (page - 1) * per_page)
+
+    return _load_results(hits)
+
+
+def _load_results(hits):
+    from .models import ArchivedMessage, CounselingSession, Message
+
+    ids = {'message': [], 'session': []}
+    for rowid, _, _ in hits:
+        kind, object_id = split_row_id(rowid)
+        ids[kind].append(object_id)
+
+    objects = {}
+    if ids['message']:
+        # Archived messages keep their id, so look in both tables
+        for model in (ArchivedMessage, Message):
+            for message in model.objects.filter(pk__in=ids['message']).select_related(
+                    'sender', 'receiver'):
+                objects['message', message.pk] = message
+    if ids['session']:
+        for session in CounselingSession.objects.filter(pk__in=ids['session']).select_related(
+                'assignment__user__user_profile', 'assignment__counselor__counselor_profile'):
+            objects['session', session.pk] = session
+
+    results = []
+    for rowid, snippet, rank in hits:
+        key = split_row_id(rowid)
+        if key in objects:
+            results.append({
+                'kind': key[0],
+                'object': objects[key],
+                'snippet': highlight(snippet),
+                'rank': rank,
+            })
+    return results
+
+
+def rebuild(batch_size=1000, stdout=None):
+    """Recreate the index from Message, ArchivedMessage and CounselingSession"""
+    from .models import ArchivedMessage, CounselingSession, Message
+
+    backend = get_backend()
+    if backend is None:
+        return 0
+
+    with connection.cursor() as cursor:
+        backend.drop_index(cursor)
+        backend.create_index(cursor)
+
+    total = 0
+    for model in (ArchivedMessage, Message):
+        rows = []
+        for message in model.objects.only(
+                'pk', 'sender_id', 'receiver_id', 'content').iterator(chunk_size=batch_size):
+            rows.append((row_id('message', message.pk), message.content,
+                         (message.sender_id, message.receiver_id)))
+            if len(rows) >= batch_size:
+                total += _flush(rows)
+        total += _flush(rows)
+
+    rows = []
+    sessions = CounselingSession.objects.exclude(notes__isnull=True).select_related(
+        'assignment').only('pk', 'notes', 'assignment__user_id', 'assignment__counselor_id')
+    for session in sessions.iterator(chunk_size=batch_size):
+        if session.notes:
+            participants = [p for p in (session.assignment.user_id,
+                                        session.assignment.counselor_id) if p]
+            rows.append((row_id('session', session.pk), session.notes, participants))
+        if len(rows) >= batch_size:
+            total += _flush(rows)
+    total += _flush(rows)
+    return total
+
+
+def _flush(rows):
+    count = len(rows)
+    _upsert(rows)
+    rows.clear()
+    return count
@@ -0,0 +1,238 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import search
+from .assignments import invalidate_graph
+from .models import (
+    CounselingSession,
+    CounselorAssignment,
+    CounselorAvailability,
+    CounselorProfile,
+    DirtySessionDay,
+    DocumentBlob,
+    Message,
+)
+from .workload import apply_stats_delta, refresh_counselor_stats, slot_minutes
+
+
+def _document_name(instance):
+    # Read the raw attribute so deferred fields don't trigger a query
+    value = instance.__dict__.get('verification_document')
+    return getattr(value, 'name', value) or ''
+
+
+def _change_blob_refs(name, delta):
+    if not name:
+        return
+    DocumentBlob.objects.get_or_create(name=name)
+    DocumentBlob.objects.filter(name=name).update(
+        ref_count=F('ref_count') + delta)
+
+
+@receiver(post_init, sender=CounselorProfile)
+def remember_verification_document(sender, instance, **kwargs):
+    if 'verification_document' in instance.__dict__:
+        instance._stored_document_name = _document_name(instance)
+    else:
+        instance._stored_document_name = None
+
+
+@receiver(post_save, sender=CounselorProfile)
+def count_verification_document(sender, instance, **kwargs):
+    old_name = instance._stored_document_name
+    if old_name is None or 'verification_document' not in instance.__dict__:
+        # Loaded with the field deferred; gc_document_blobs --reconcile
+        # corrects any drift
+        return
+    new_name = _document_name(instance)
+    if new_name != old_name:
+        _change_blob_refs(new_name, 1)
+        _change_blob_refs(old_name, -1)
+        instance._stored_document_name = new_name
+
+
+@receiver(post_delete, sender=CounselorProfile)
+def release_verification_document(sender, instance, **kwargs):
+    _change_blob_refs(_document_name(instance), -1)
+
+
+@receiver(post_save, sender=Message)
+def index_message(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_message(instance)
+
+
+@receiver(post_save, sender=CounselingSession)
+def index_session(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_session(instance)
+
+
+@receiver(post_delete, sender=CounselingSession)
+def unindex_session(sender, instance, **kwargs):
+    search.remove(search.row_id('session', instance.pk))
+
+
+# Counselor workload stats. Each model contributes numbers to its
+# counselor's CounselorStats row; on save the difference between the old
+# and new contribution is applied as a single F() update.
+
+def _snapshot(instance, fields):
+    if all(field in instance.__dict__ for field in fields):
+        return tuple(instance.__dict__[field] for field in fields)
+    return None
+
+
+def _counselor_for_assignment(assignment_id):
+    return CounselorAssignment.objects.filter(pk=assignment_id).values_list(
+        'counselor_id', flat=True).first()
+
+
+def assignment_contribution(counselor_id, status):
+    return counselor_id, {'active_assignments': int(status == 'active')}
+
+
+def session_contribution(assignment_id, status, upcoming):
+    return _counselor_for_assignment(assignment_id), {
+        'upcoming_sessions': int(upcoming),
+        'completed_sessions': int(status == 'completed'),
+    }
+
+
+def session_state(assignment_id, status, scheduled_time):
+    # Whether a session counts as upcoming is settled when it is loaded or
+    # saved, not when the change is applied: a session whose time passes in
+    # between still takes back the +1 it added. Sessions that are already
+    # past when loaded aren't counted; refresh_counselor_stats ages them out.
+    upcoming = status == 'scheduled' and scheduled_time is not None \
+        and scheduled_time >= timezone.now()
+    return assignment_id, status, upcoming
+
+
+def availability_contribution(counselor_id, is_available, start_time, end_time):
+    minutes = slot_minutes(start_time, end_time) if is_available else 0
+    return counselor_id, {'weekly_available_minutes': minutes}
+
+
+# model: (fields, contribution, state). The snapshot passed to contribution
+# is state(*fields) when a state function is given.
+STATS_SOURCES = {
+    CounselorAssignment: (('counselor_id', 'status'), assignment_contribution, None),
+    CounselingSession: (
+        ('assignment_id', 'status', 'scheduled_time'), session_contribution, session_state),
+    CounselorAvailability: (
+        ('counselor_id', 'is_available', 'start_time', 'end_time'),
+        availability_contribution, None),
+}
+
+
+def _stats_snapshot(sender, instance):
+    fields, _, state = STATS_SOURCES[sender]
+    snapshot = _snapshot(instance, fields)
+    if snapshot is not None and state:
+        return state(*snapshot)
+    return snapshot
+
+
+def _apply_contribution_change(old, new):
+    old_counselor, old_values = old if old else (None, {})
+    new_counselor, new_values = new if new else (None, {})
+    if old_counselor == new_counselor:
+        apply_stats_delta(new_counselor, **{
+            field: new_values.get(field, 0) - old_values.get(field, 0)
+            for field in set(old_values) | set(new_values)
+        })
+    else:
+        apply_stats_delta(old_counselor, **{f: -v for f, v in old_values.items()})
+        apply_stats_delta(new_counselor, **new_values)
+
+
+def remember_stats_contribution(sender, instance, **kwargs):
+    instance._stats_snapshot = _stats_snapshot(sender, instance)
+
+
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    contribution = STATS_SOURCES[sender][1]
+    new_snapshot = _stats_snapshot(sender, instance)
+    old_snapshot = None if created else instance._stats_snapshot
+    if new_snapshot is None or (old_snapshot is None and not created):
+        # Saved with deferred fields; recompute from the source tables
+        counselor_id = (_counselor_for_assignment(instance.assignment_id)
+                        if sender is CounselingSession else instance.counselor_id)
+        if counselor_id:
+            refresh_counselor_stats(counselor_id)
+    elif new_snapshot != old_snapshot:
+        _apply_contribution_change(
+            contribution(*old_snapshot) if old_snapshot else None,
+            contribution(*new_snapshot),
+        )
+    instance._stats_snapshot = new_snapshot
+
+
+def update_stats_on_delete(sender, instance, **kwargs):
+    contribution = STATS_SOURCES[sender][1]
+    snapshot = instance._stats_snapshot
+    if snapshot is not None:
+        _apply_contribution_change(contribution(*snapshot), None)
+
+
+for stats_source in STATS_SOURCES:
+    post_init.connect(remember_stats_contribution, sender=stats_source)
+    post_save.connect(update_stats_on_save, sender=stats_source)
+    post_delete.connect(update_stats_on_delete, sender=stats_source)
+
+
+@receiver(post_init, sender=CounselorAssignment)
+def remember_assignment_ends(sender, instance, **kwargs):
+    instance._graph_ends = (instance.__dict__.get('counselor_id'),
+                            instance.__dict__.get('user_id'))
+
+
+@receiver(post_save, sender=CounselorAssignment)
+@receiver(post_delete, sender=CounselorAssignment)
+def invalidate_assignment_graph(sender, instance, **kwargs):
+    counselor_ids = {instance._graph_ends[0], instance.counselor_id}
+    user_ids = {instance._graph_ends[1], instance.user_id}
+    assignment_ids = {instance.pk}
+    # After commit, so a reader can't cache the old edges in between
+    transaction.on_commit(lambda: invalidate_graph(counselor_ids, user_ids, assignment_ids))
+    instance._graph_ends = (instance.counselor_id, instance.user_id)
+
+
+# Session rollups (core.analytics) recompute the days of changed sessions;
+# a session that moves or goes away also leaves its old day stale
+
+@receiver(post_init, sender=CounselingSession)
+def remember_rollup_day(sender, instance, **kwargs):
+    instance._rollup_scheduled_time = instance.__dict__.get('scheduled_time')
+
+
+@receiver(post_save, sender=CounselingSession)
+def mark_old_rollup_day(sender, instance, created, raw=False, **kwargs):
+    old = instance._rollup_scheduled_time
+    if not raw and not created and old is not None and old != instance.scheduled_time:
+        DirtySessionDay.objects.create(scheduled_time=old)
+    instance._rollup_scheduled_time = instance.scheduled_time
+
+
+@receiver(post_delete, sender=CounselingSession)
+def mark_deleted_rollup_day(sender, instance, **kwargs):
+    if instance._rollup_scheduled_time is not None:
+        DirtySessionDay.objects.create(scheduled_time=instance._rollup_scheduled_time)
+
+
+@receiver(user_logged_in)
+def remember_counselor_timezone(sender, request, user, **kwargs):
+    from .middleware import TIMEZONE_SESSION_KEY
+
+    if user.user_type != 'counselor' or request is None:
+        return
+    name = CounselorProfile.objects.filter(user=user).values_list('timezone', flat=True).first()
+    if name:
+        request.session[TIMEZONE_SESSION_KEY] = name
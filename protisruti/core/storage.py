@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its
+    content, sharded two levels deep (``<dir>/ab/cd/abcd....pdf``).
+
+    Saving content that is already stored is a no-op, and stored blobs never
+    change once written, so backups of the media folder are incremental.
+    Reference counting and garbage collection live in DocumentBlob and the
+    ``gc_document_blobs`` command.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Identical names always mean identical bytes, so overwriting is safe
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(*args, **kwargs)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None) or self.compute_hash(content)
+        name = self.hashed_name(name, digest)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+    @staticmethod
+    def compute_hash(content):
+        hasher = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        content.seek(0)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def hashed_name(name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4], digest + extension)
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes gzip and (when the brotli package is
+    installed) brotli variants of every hashed text asset, so the web server
+    can serve precompressed files with far-future cache headers.
+    """
+    compressible_extensions = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for hashed_name in hashed_names.values():
+            if hashed_name.endswith(self.compressible_extensions):
+                self.write_compressed_variants(hashed_name)
+
+    def write_compressed_variants(self, name):
+        with self.open(name) as source:
+            content = source.read()
+
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+
+        for suffix, compressed in variants:
+            # Skip variants that don't pay for the extra request negotiation
+            if len(compressed) < len(content):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
@@ -1,3 +1,241 @@
-from django.test import TestCase
+import json
+import uuid
+from datetime import time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ical, ratelimit
+from .assignments import update_assignment
+from .forms import UserCounselorAssignmentForm
+from .models import (
+    ConcurrentUpdateError,
+    CounselingSession,
+    CounselorAssignment,
+    CounselorAvailability,
+    CounselorProfile,
+    CounselorStats,
+    Message,
+    User,
+    UserProfile,
+)
+
+
+def create_assignment():
+    counselor = User.objects.create_user('counselor@example.com', 'pw', user_type='counselor')
+    CounselorProfile.objects.create(
+        user=counselor, full_name='Counselor', specialization='general',
+        qualification='MA', bio='', verification_status='verified')
+    user = User.objects.create_user('user@example.com', 'pw')
+    UserProfile.objects.create(user=user, full_name='User')
+    return CounselorAssignment.objects.create(counselor=counselor, user=user)
+
+
+class AssignmentVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assignment = create_assignment()
+        cls.counselor, cls.user = cls.assignment.counselor, cls.assignment.user
+
+    def test_save_bumps_version(self):
+        assignment = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        assignment.notes = 'first'
+        assignment.save()
+        self.assertEqual(assignment.version, 2)
+        self.assertEqual(CounselorAssignment.objects.get(pk=self.assignment.pk).version, 2)
+
+    def test_stale_save_is_rejected(self):
+        first = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        second = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        first.status = 'paused'
+        first.save()
+        second.notes = 'written on top of an old copy'
+        with self.assertRaises(ConcurrentUpdateError), transaction.atomic():
+            second.save()
+        stored = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        self.assertEqual(stored.status, 'paused')
+        self.assertIsNone(stored.notes)
+
+    def test_update_assignment_retries_on_a_concurrent_change(self):
+        calls = []
+
+        def change(assignment):
+            if not calls:
+                # Another writer gets in between this read and the write
+                other = CounselorAssignment.objects.get(pk=assignment.pk)
+                other.status = 'paused'
+                other.save()
+            calls.append(assignment.version)
+            assignment.notes = 'retried'
+            return ['notes']
+
+        assignment = update_assignment(self.assignment.pk, change)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(assignment.version, 3)
+        stored = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        self.assertEqual((stored.status, stored.notes), ('paused', 'retried'))
+
+    def test_update_assignment_gives_up(self):
+        def change(assignment):
+            other = CounselorAssignment.objects.get(pk=assignment.pk)
+            other.save()
+            assignment.notes = 'never saved'
+            return ['notes']
+
+        with self.assertRaises(ConcurrentUpdateError):
+            update_assignment(self.assignment.pk, change, attempts=2)
+
+    def form_data(self, version, **changes):
+        data = {'counselor': self.counselor.pk, 'user': self.user.pk, 'status': 'active',
+                'notes': '', 'loaded_version': version}
+        data.update(changes)
+        return data
+
+    def test_form_rejects_an_edit_of_an_older_version(self):
+        rendered = UserCounselorAssignmentForm(instance=self.assignment)
+        loaded = rendered['loaded_version'].value()
+        other = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        other.notes = 'edited elsewhere'
+        other.save()
+
+        form = UserCounselorAssignmentForm(
+            self.form_data(loaded, status='paused'),
+            instance=CounselorAssignment.objects.get(pk=self.assignment.pk))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors().as_data()[0].code, 'stale')
+
+        form = UserCounselorAssignmentForm(
+            self.form_data(other.version, status='paused'),
+            instance=CounselorAssignment.objects.get(pk=self.assignment.pk))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().version, other.version + 1)
+
+    def test_admin_change_of_an_older_version_shows_an_error(self):
+        admin = User.objects.create_superuser('admin@example.com', 'pw')
+        self.client.force_login(admin)
+        url = reverse('admin:core_counselorassignment_change', args=[self.assignment.pk])
+        other = CounselorAssignment.objects.get(pk=self.assignment.pk)
+        other.save()
+
+        response = self.client.post(url, self.form_data(1, status='paused', last_session=''))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Someone else changed this record')
+        self.assertEqual(CounselorAssignment.objects.get(pk=self.assignment.pk).status, 'active')
+
+        response = self.client.post(url, self.form_data(2, status='paused', last_session=''))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CounselorAssignment.objects.get(pk=self.assignment.pk).status, 'paused')
+
+
+class CounselorStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assignment = create_assignment()
+
+    def stats(self):
+        stats = CounselorStats.objects.get(counselor=self.assignment.counselor)
+        return stats.upcoming_sessions, stats.completed_sessions
+
+    def complete_after_start(self, session, start):
+        with mock.patch('django.utils.timezone.now', return_value=start + timedelta(hours=1)):
+            session.status = 'completed'
+            session.save()
+
+    def test_completing_a_session_after_its_start_time(self):
+        start = timezone.now() + timedelta(minutes=5)
+        session = CounselingSession.objects.create(assignment=self.assignment, scheduled_time=start)
+        self.assertEqual(self.stats(), (1, 0))
+
+        self.complete_after_start(session, start)
+        self.assertEqual(self.stats(), (0, 1))
+
+    def test_completing_a_session_loaded_before_its_start_time(self):
+        start = timezone.now() + timedelta(minutes=5)
+        session = CounselingSession.objects.create(assignment=self.assignment, scheduled_time=start)
+
+        self.complete_after_start(CounselingSession.objects.get(pk=session.pk), start)
+        self.assertEqual(self.stats(), (0, 1))
+
+
+class CalendarFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counselor = create_assignment().counselor
+        cls.url = reverse('calendar_feed', args=[ical.get_feed_token(cls.counselor).token])
+
+    def test_changing_the_zone_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        CounselorProfile.objects.filter(user=self.counselor).update(timezone='Asia/Dhaka')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_availability_zone_is_defined(self):
+        CounselorProfile.objects.filter(user=self.counselor).update(timezone='America/New_York')
+        CounselorAvailability.objects.create(
+            counselor=self.counselor, day=0, start_time=time(9), end_time=time(12))
+        feed = b''.join(self.client.get(self.url).streaming_content).decode()
+
+        self.assertIn('DTSTART;TZID=America/New_York:', feed)
+        vtimezone = feed[feed.index('BEGIN:VTIMEZONE'):feed.index('END:VTIMEZONE')]
+        self.assertIn('TZID:America/New_York\r\n', vtimezone)
+        self.assertIn('TZOFFSETFROM:-0400\r\nTZOFFSETTO:-0500\r\n', vtimezone)
+        self.assertIn('TZOFFSETFROM:-0500\r\nTZOFFSETTO:-0400\r\n', vtimezone)
+        self.assertLess(feed.index('END:VTIMEZONE'), feed.index('BEGIN:VEVENT'))
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_RULES={'login': {'account': (2, 60)}})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        ratelimit._store = None
+        self.addCleanup(setattr, ratelimit, '_store', None)
+
+    async def test_throttles_async_requests(self):
+        responses = [await self.async_client.post(reverse('login'), {'username': 'a@example.com'})
+                     for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertIn('Retry-After', responses[-1])
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.assignment = create_assignment()
+
+    def setUp(self):
+        self.client.force_login(self.assignment.user)
+
+    def sync(self, **body):
+        response = self.client.post(reverse('api_sync'), json.dumps(body),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_resending_an_outbox_creates_no_second_message(self):
+        client_id = str(uuid.uuid4())
+        outbox = [{'client_id': client_id, 'assignment_id': self.assignment.pk,
+                   'content': 'sent while offline'}]
+
+        first = self.sync(outbox=outbox)
+        again = self.sync(outbox=outbox)
+
+        self.assertEqual(first['sent'][0]['duplicate'], False)
+        self.assertEqual(again['sent'][0]['duplicate'], True)
+        self.assertEqual(again['sent'][0]['id'], first['sent'][0]['id'])
+        self.assertEqual(Message.objects.filter(client_id=client_id).count(), 1)
+
+    def test_a_malformed_entry_is_rejected_alone(self):
+        good = str(uuid.uuid4())
+        result = self.sync(outbox=[
+            {'client_id': good, 'assignment_id': self.assignment.pk, 'content': 'kept'},
+            {'client_id': 'not-a-uuid', 'assignment_id': self.assignment.pk, 'content': 'bad'},
+        ])
+
+        self.assertEqual([entry['client_id'] for entry in result['sent']], [good])
+        self.assertEqual([entry['client_id'] for entry in result['rejected']], ['not-a-uuid'])
+        self.assertEqual(Message.objects.count(), 1)
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import close_old_connections, transaction
+from django.http import FileResponse, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SIZE = (320, 320)
+PREVIEW_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+_executor = None
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded files to a temporary file chunk by chunk and computes
+    a SHA-256 digest on the fly, so the file is never held in memory.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+def attach_verification_document(profile, uploaded=None):
+    """
+    Record the content hash of a freshly uploaded verification document.
+    Deduplication itself happens in ContentAddressedStorage.
+    """
+    digest = getattr(uploaded, 'sha256', None)
+    if digest:
+        profile.document_sha256 = digest
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'UPLOAD_WORKER_THREADS', 2),
+            thread_name_prefix='upload-worker',
+        )
+    return _executor
+
+
+def enqueue(func, *args):
+    """Run func in the background worker once the current transaction commits"""
+    transaction.on_commit(lambda: _get_executor().submit(_run_task, func, *args))
+
+
+def _run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        close_old_connections()
+
+
+def preview_name(digest):
+    return f'verification_previews/{digest[:2]}/{digest}.jpg'
+
+
+def generate_document_preview(profile_id):
+    """Create a JPEG thumbnail for image verification documents"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from io import BytesIO
+    from .models import CounselorProfile
+
+    profile = CounselorProfile.objects.filter(pk=profile_id).first()
+    if not profile or not profile.verification_document or not profile.document_sha256:
+        return
+    if not profile.verification_document.name.lower().endswith(PREVIEW_EXTENSIONS):
+        return
+
+    name = preview_name(profile.document_sha256)
+    if default_storage.exists(name):
+        return
+
+    with profile.verification_document.open('rb') as source:
+        image = Image.open(source)
+        image.thumbnail(PREVIEW_SIZE)
+        buffer = BytesIO()
+        image.convert('RGB').save(buffer, format='JPEG', quality=80)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def sendfile_response(file_path, content_type=None, filename=None):
+    """
+    Hand file delivery to the front-end web server when SENDFILE_BACKEND is
+    configured ('nginx' uses X-Accel-Redirect, 'apache' uses X-Sendfile).
+    Falls back to streaming the file through Django.
+    """
+    backend = getattr(settings, 'SENDFILE_BACKEND', None)
+    filename = filename or os.path.basename(file_path)
+
+    if backend == 'nginx':
+        relative = os.path.relpath(file_path, settings.MEDIA_ROOT)
+        response = HttpResponse(content_type=content_type or '')
+        response['X-Accel-Redirect'] = settings.SENDFILE_URL + relative.replace(os.sep, '/')
+    elif backend == 'apache':
+        response = HttpResponse(content_type=content_type or '')
+        response['X-Sendfile'] = file_path
+    else:
+        return FileResponse(open(file_path, 'rb'), filename=filename)
+
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
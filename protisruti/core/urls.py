@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Read-heavy pages have ASGI-native implementations; use them when served
+# by an ASGI server so requests skip the sync-to-async thread bridge.
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -9,19 +14,25 @@ urlpatterns = [
     path('register/counselor/', views.register_counselor,
          name='register_counselor'),
     path('logout/', views.logout_view, name='logout'),
-    path('dashboard/user/', views.user_dashboard, name='user_dashboard'),
-    path('dashboard/counselor/', views.counselor_dashboard,
+    path('dashboard/user/', read_views.user_dashboard, name='user_dashboard'),
+    path('dashboard/counselor/', read_views.counselor_dashboard,
          name='counselor_dashboard'),
 
     path('counselor/availability/', views.manage_availability,
          name='manage_availability'),
+    path('counselor/availability/week/', views.weekly_availability,
+         name='weekly_availability'),
     path('counselor/availability/delete/<int:availability_id>/',
          views.delete_availability, name='delete_availability'),
-    path('counselor/assignments/', views.view_assignments, name='view_assignments'),
+    path('counselor/assignments/', read_views.view_assignments, name='view_assignments'),
     path('counselor/assignment/<int:assignment_id>/',
-         views.assignment_detail, name='assignment_detail'),
+         read_views.assignment_detail, name='assignment_detail'),
     path('counselor/schedule-session/<int:assignment_id>/',
          views.schedule_session, name='schedule_session'),
+    path('counselor/schedule-series/<int:assignment_id>/',
+         views.schedule_series, name='schedule_series'),
+    path('counselor/session/edit-series/<int:session_id>/',
+         views.edit_series, name='edit_series'),
     path('counselor/session/update-status/<int:session_id>/',
          views.update_session_status, name='update_session_status'),
 
@@ -30,13 +41,39 @@ urlpatterns = [
          views.verify_counselors, name='verify_counselors'),
     path('admin/verify-counselor/<int:counselor_id>/',
          views.counselor_verification_detail, name='counselor_verification_detail'),
+    path('verification-document/<int:counselor_id>/',
+         views.verification_document, name='verification_document'),
     path('admin/assign-counselor/',
          views.assign_counselor, name='assign_counselor'),
+    path('admin/counselor-capacity/',
+         views.counselor_capacity, name='counselor_capacity'),
+    path('admin/analytics/',
+         views.analytics_dashboard, name='analytics_dashboard'),
+    path('admin/export/', views.export_data, name='export_data'),
+    path('admin/import-users/', views.import_users, name='import_users'),
+    path('admin/export/<str:dataset_name>/',
+         views.export_download, name='export_download'),
 
     path('victim/assignments/', views.victim_assignments,
          name='victim_assignments'),
     path('counselor/assignments/', views.counselor_assignments,
          name='counselor_assignments'),
-    path('chat/<int:assignment_id>/', views.chat_view, name='chat_view'),
-    path('chat/<str:receiver_email>/', views.chat_view, name='chat'),
+    path('chat/<int:assignment_id>/', read_views.chat_view, name='chat_view'),
+    path('chat/<int:assignment_id>/status/', views.chat_status, name='chat_status'),
+    path('chat/<str:receiver_email>/', views.chat_redirect, name='chat'),
+    path('search/', views.search_view, name='search'),
+    path('calendar/', views.calendar_settings, name='calendar_settings'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
+
+    # JSON API (v1)
+    path('api/v1/dashboard/user/', api.user_dashboard, name='api_user_dashboard'),
+    path('api/v1/dashboard/counselor/', api.counselor_dashboard,
+         name='api_counselor_dashboard'),
+    path('api/v1/assignments/', api.assignment_list, name='api_assignment_list'),
+    path('api/v1/assignments/<int:assignment_id>/', api.assignment_detail,
+         name='api_assignment_detail'),
+    path('api/v1/sessions/', api.session_list, name='api_session_list'),
+    path('api/v1/availabilities/', api.availability_list,
+         name='api_availability_list'),
+    path('api/v1/sync/', api.sync, name='api_sync'),
 ]
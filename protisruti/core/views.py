@@ -1,6 +1,11 @@
+import functools
+import io
+import mimetypes
+import os
+
 from django.shortcuts import get_object_or_404
 from .forms import MessageForm
-from .models import Message, VictimCounselorAssignment
+from .models import Message
 from django.shortcuts import render, get_object_or_404, redirect
 from django.shortcuts import render
 from django.utils import timezone
@@ -9,17 +14,29 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.views import LoginView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import CreateView
 from django.db import transaction
 from django.db import models
+from django.db.models import Max, Q, Sum
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 
-from .models import CounselingSession, CounselorAssignment, CounselorAvailability, User, UserProfile, CounselorProfile, Message, VictimCounselorAssignment
+from .models import CalendarFeedToken, ConcurrentUpdateError, CounselingSession, CounselorAssignment, CounselorAvailability, CounselorStats, User, UserProfile, CounselorProfile, Message
 
 from .forms import (
     CounselingSessionForm,
     CounselorAvailabilityForm,
     CounselorVerificationForm,
+    ExportForm,
+    ImportUsersForm,
+    SeriesEditForm,
+    SessionSeriesForm,
+    WeeklyAvailabilityForm,
     CustomAuthenticationForm,
     UserCounselorAssignmentForm,
     UserRegistrationForm,
@@ -29,6 +46,19 @@ from .forms import (
     MessageForm
 )
 from .decorators import admin_required, user_required, counselor_required
+from .middleware import TIMEZONE_SESSION_KEY
+from . import analytics, assignments, availability, bulk_import, exports, ical, scheduling, search
+from . import messaging
+from .messaging import CHAT_HISTORY_LIMIT, conversation_history
+from .workload import refresh_counselor_stats
+from .uploads import (
+    attach_verification_document,
+    enqueue,
+    generate_document_preview,
+    sendfile_response,
+)
+
+SEARCH_PAGE_SIZE = 20
 
 
 def home(request):
@@ -118,7 +148,10 @@ def register_counselor(request):
                 profile = profile_form.save(commit=False)
                 profile.user = user
                 profile.verification_status = 'pending'  # Ensure status is set to pending
+                attach_verification_document(
+                    profile, request.FILES.get('verification_document'))
                 profile.save()
+                enqueue(generate_document_preview, profile.pk)
 
             messages.success(
                 request, 'Registration successful. Your account is pending verification.')
@@ -143,10 +176,13 @@ def logout_view(request):
 
 @login_required
 @user_required
+@cache_control(private=True, no_cache=True)
 def user_dashboard(request):
     """Dashboard for regular users"""
     try:
-        user_profile = UserProfile.objects.get(user=request.user)
+        user_profile = UserProfile.objects.prefetch_related(
+            'user__assigned_counselors__counselor__counselor_profile'
+        ).get(user=request.user)
         context = {
             'user_profile': user_profile,
         }
@@ -158,6 +194,7 @@ def user_dashboard(request):
 
 @login_required
 @counselor_required
+@cache_control(private=True, no_cache=True)
 def counselor_dashboard(request):
     """Enhanced dashboard for counselors"""
     try:
@@ -226,7 +263,13 @@ def profile_edit(request):
                     profile = profile_form.save(commit=False)
                     # Don't update verification status when editing profile
                     profile.verification_status = counselor_profile.verification_status
+                    attach_verification_document(
+                        profile, request.FILES.get('verification_document'))
                     profile.save()
+                    enqueue(generate_document_preview, profile.pk)
+                    if 'timezone' in profile_form.changed_data:
+                        availability.refresh_projection(request.user.pk)
+                    request.session[TIMEZONE_SESSION_KEY] = profile.timezone
                     messages.success(
                         request, 'Your profile has been updated successfully.')
                     return redirect('counselor_dashboard')
@@ -257,24 +300,16 @@ def manage_availability(request):
     if request.method == 'POST':
         form = CounselorAvailabilityForm(request.POST)
         if form.is_valid():
-            availability = form.save(commit=False)
-            availability.counselor = request.user
-
-            # Check if this time slot already exists
-            existing = CounselorAvailability.objects.filter(
-                counselor=request.user,
-                day=availability.day,
-                start_time=availability.start_time,
-                end_time=availability.end_time
-            )
-
-            if existing.exists():
-                existing.update(is_available=availability.is_available)
+            # Slots are merged with overlapping or adjacent ones; marking a
+            # range unavailable cuts it out of the existing slots
+            slot = (request.user, form.cleaned_data['day'],
+                    form.cleaned_data['start_time'], form.cleaned_data['end_time'])
+            if form.cleaned_data['is_available']:
+                availability.add_slot(*slot)
                 messages.success(request, "Availability updated successfully.")
             else:
-                availability.save()
-                messages.success(
-                    request, "New availability added successfully.")
+                availability.remove_slot(*slot)
+                messages.success(request, "Time marked as unavailable.")
 
             return redirect('manage_availability')
     else:
@@ -292,19 +327,36 @@ def manage_availability(request):
     return render(request, 'manage_availability.html', context)
 
 
+@login_required
+@counselor_required
+def weekly_availability(request):
+    """Edit the whole weekly availability template in one go"""
+    if request.method == 'POST':
+        form = WeeklyAvailabilityForm(request.POST)
+        if form.is_valid():
+            availability.apply_weekly_template(request.user, form.cleaned_data['week'])
+            messages.success(request, "Weekly availability saved.")
+            return redirect('weekly_availability')
+    else:
+        form = WeeklyAvailabilityForm(week=availability.day_intervals(request.user))
+
+    return render(request, 'weekly_availability.html', {'form': form})
+
+
 @login_required
 @counselor_required
 def delete_availability(request, availability_id):
     """View to delete a counselor availability slot"""
-    availability = get_object_or_404(
+    slot = get_object_or_404(
         CounselorAvailability, pk=availability_id, counselor=request.user)
 
     if request.method == 'POST':
-        availability.delete()
+        slot.delete()
+        availability.refresh_projection(request.user.pk)
         messages.success(request, "Availability slot deleted successfully.")
         return redirect('manage_availability')
 
-    return render(request, 'delete_availability_confirm.html', {'availability': availability})
+    return render(request, 'delete_availability_confirm.html', {'availability': slot})
 
 
 @login_required
@@ -382,6 +434,73 @@ def schedule_session(request, assignment_id):
     return render(request, 'schedule_session.html', context)
 
 
+@login_required
+@counselor_required
+def schedule_series(request, assignment_id):
+    """View for counselors to schedule recurring sessions with an assigned user"""
+    assignment = get_object_or_404(
+        CounselorAssignment,
+        pk=assignment_id,
+        counselor=request.user,
+        status='active'
+    )
+
+    if request.method == 'POST':
+        form = SessionSeriesForm(request.POST, counselor=request.user)
+        if form.is_valid():
+            scheduling.create_series(
+                assignment,
+                form.cleaned_data['start_time'],
+                form.cleaned_data['duration_minutes'],
+                form.cleaned_data['interval_weeks'],
+                until=form.cleaned_data['until'],
+                count=form.cleaned_data['count'],
+            )
+            messages.success(
+                request, f"Recurring sessions scheduled with {assignment.user.user_profile.full_name}.")
+            return redirect('assignment_detail', assignment_id=assignment.id)
+    else:
+        form = SessionSeriesForm(counselor=request.user)
+
+    context = {
+        'form': form,
+        'assignment': assignment
+    }
+    return render(request, 'schedule_series.html', context)
+
+
+@login_required
+@counselor_required
+def edit_series(request, session_id):
+    """Move a session and all following sessions of its series"""
+    session = get_object_or_404(
+        CounselingSession.objects.select_related('series__assignment__counselor'),
+        pk=session_id,
+        assignment__counselor=request.user,
+        series__isnull=False,
+        status='scheduled'
+    )
+
+    if request.method == 'POST':
+        form = SeriesEditForm(request.POST, session=session)
+        if form.is_valid():
+            scheduling.split_series(
+                session,
+                form.cleaned_data['scheduled_time'],
+                form.cleaned_data['duration_minutes'],
+            )
+            messages.success(request, "This and the following sessions were updated.")
+            return redirect('assignment_detail', assignment_id=session.assignment_id)
+    else:
+        form = SeriesEditForm(session=session)
+
+    context = {
+        'form': form,
+        'session': session
+    }
+    return render(request, 'edit_series.html', context)
+
+
 @login_required
 @counselor_required
 def update_session_status(request, session_id):
@@ -400,8 +519,12 @@ def update_session_status(request, session_id):
 
             # If completed, update the last session date of the assignment
             if status == 'completed':
-                session.assignment.last_session = timezone.now()
-                session.assignment.save()
+                try:
+                    assignments.record_completed_session(session.assignment_id, timezone.now())
+                except ConcurrentUpdateError:
+                    messages.warning(
+                        request, "The assignment is being edited elsewhere; its last "
+                                 "session date was not updated.")
 
             messages.success(
                 request, f"Session status updated to {session.get_status_display()}.")
@@ -424,15 +547,15 @@ def verify_counselors(request):
     """View for admins to verify counselor accounts"""
     pending_counselors = CounselorProfile.objects.filter(
         verification_status='pending'
-    ).select_related('user')
+    ).select_related('user__workload_stats')
 
     verified_counselors = CounselorProfile.objects.filter(
         verification_status='verified'
-    ).select_related('user')
+    ).select_related('user__workload_stats')
 
     rejected_counselors = CounselorProfile.objects.filter(
         verification_status='rejected'
-    ).select_related('user')
+    ).select_related('user__workload_stats')
 
     context = {
         'pending_counselors': pending_counselors,
@@ -479,6 +602,21 @@ def counselor_verification_detail(request, counselor_id):
     return render(request, 'counselor_verification_detail.html', context)
 
 
+@login_required
+def verification_document(request, counselor_id):
+    """Serve a counselor's verification document to admins and its owner"""
+    counselor_profile = get_object_or_404(
+        CounselorProfile,
+        user__id=counselor_id
+    )
+    if request.user.user_type != 'admin' and request.user != counselor_profile.user:
+        raise PermissionDenied
+    if not counselor_profile.verification_document:
+        raise Http404("No verification document uploaded.")
+
+    return sendfile_response(counselor_profile.verification_document.path)
+
+
 @login_required
 @admin_required
 def assign_counselor(request):
@@ -486,10 +624,14 @@ def assign_counselor(request):
     if request.method == 'POST':
         form = UserCounselorAssignmentForm(request.POST)
         if form.is_valid():
-            assignment = form.save()
-            messages.success(
-                request, f"{assignment.user.user_profile.full_name} has been assigned to {assignment.counselor.counselor_profile.full_name}.")
-            return redirect('assign_counselor')
+            try:
+                assignment = assignments.create_assignment(form)
+            except assignments.AssignmentExists as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(
+                    request, f"{assignment.user.user_profile.full_name} has been assigned to {assignment.counselor.counselor_profile.full_name}.")
+                return redirect('assign_counselor')
     else:
         form = UserCounselorAssignmentForm()
 
@@ -498,40 +640,359 @@ def assign_counselor(request):
         status='active'
     ).select_related('user__user_profile', 'counselor__counselor_profile')
 
+    # Current workload of each selectable counselor, from the stats table
+    counselors = form.fields['counselor'].queryset.select_related(
+        'counselor_profile', 'workload_stats')
+
     context = {
         'form': form,
-        'active_assignments': active_assignments
+        'active_assignments': active_assignments,
+        'counselors': counselors,
     }
     return render(request, 'assign_counselor.html', context)
 
 
+@login_required
+@admin_required
+def counselor_capacity(request):
+    """Capacity report of verified counselors, read from the stats table"""
+    stats = CounselorStats.objects.filter(
+        counselor__counselor_profile__verification_status='verified'
+    ).select_related('counselor__counselor_profile').order_by('active_assignments')
+
+    totals = stats.aggregate(
+        active_assignments=Sum('active_assignments'),
+        upcoming_sessions=Sum('upcoming_sessions'),
+        weekly_available_minutes=Sum('weekly_available_minutes'),
+        updated_at=Max('updated_at'),
+    )
+
+    stats = list(stats)
+    free_minutes = availability.weekly_free_minutes([row.counselor_id for row in stats])
+    for row in stats:
+        row.free_hours_this_week = round(free_minutes.get(row.counselor_id, 0) / 60, 1)
+    totals['free_minutes_this_week'] = sum(free_minutes.values())
+
+    context = {
+        'stats': stats,
+        'totals': totals,
+    }
+    return render(request, 'counselor_capacity.html', context)
+
+
+ANALYTICS_DAYS = 30
+ANALYTICS_WEEKS = 12
+
+
+def _bar_chart(series):
+    """Attach a bar height (percent of the series maximum) to each point"""
+    peak = max((value for _, value in series), default=0) or 1
+    return [{'bucket': bucket, 'value': value, 'percent': round(100 * value / peak)}
+            for bucket, value in series]
+
+
+@login_required
+@admin_required
+def analytics_dashboard(request):
+    """Operational charts, read only from the metric rollup tables"""
+    weekly_capacity = analytics.weekly_available_minutes()
+    utilization = []
+    for week, minutes in analytics.weekly_series(
+            analytics.SESSION_MINUTES_METRIC, ANALYTICS_WEEKS):
+        percent = round(100 * minutes / weekly_capacity) if weekly_capacity else 0
+        utilization.append({'bucket': week, 'value': percent, 'percent': min(percent, 100)})
+
+    context = {
+        'registrations': _bar_chart(analytics.daily_series('registrations', ANALYTICS_DAYS)),
+        'messages_per_day': _bar_chart(analytics.daily_series('messages', ANALYTICS_DAYS)),
+        'session_weeks': [
+            {'label': label, 'bars': _bar_chart(analytics.weekly_series(metric, ANALYTICS_WEEKS))}
+            for label, metric in (('Completed', 'sessions_completed'),
+                                  ('Missed', 'sessions_missed'),
+                                  ('Cancelled', 'sessions_cancelled'))
+        ],
+        'utilization': utilization,
+        'weekly_capacity_hours': round(weekly_capacity / 60, 1),
+    }
+    return render(request, 'analytics_dashboard.html', context)
+
+
+@login_required
+@admin_required
+def export_data(request):
+    """Export page with one form per dataset"""
+    context = {
+        'datasets': [
+            (name, dataset, ExportForm(dataset=dataset, prefix=name))
+            for name, dataset in exports.DATASETS.items()
+        ],
+    }
+    return render(request, 'export_data.html', context)
+
+
+@login_required
+@admin_required
+def export_download(request, dataset_name):
+    """Stream a dataset as CSV or JSON Lines"""
+    dataset = exports.DATASETS.get(dataset_name)
+    if dataset is None:
+        raise Http404("Unknown export")
+
+    form = ExportForm(request.GET, dataset=dataset, prefix=dataset_name)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect('export_data')
+
+    columns = exports.resolve_columns(dataset, form.cleaned_data['columns'])
+    start, end = exports.day_bounds(form.cleaned_data['start'], form.cleaned_data['end'])
+    export_format = form.cleaned_data['format']
+
+    response = StreamingHttpResponse(
+        exports.stream_rows(dataset, columns, export_format, start, end),
+        content_type='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+    )
+    filename = f"{dataset_name}-{timezone.now():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@admin_required
+def import_users(request):
+    """Bulk create users and counselors from an uploaded CSV file"""
+    result = None
+    if request.method == 'POST':
+        form = ImportUsersForm(request.POST, request.FILES)
+        if form.is_valid():
+            csv_file = io.TextIOWrapper(
+                request.FILES['csv_file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = bulk_import.import_users(csv_file)
+            except (ValueError, UnicodeDecodeError) as exc:
+                messages.error(request, f"Could not read the file: {exc}")
+            else:
+                if result.created:
+                    messages.success(request, f"Imported {result.created} account(s).")
+                if result.errors:
+                    messages.warning(
+                        request, f"{len(result.errors)} row(s) were skipped, see below.")
+    else:
+        form = ImportUsersForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'user_columns': ('user_type', 'email', 'password', 'phone_number')
+        + bulk_import.PROFILE_COLUMNS['user'],
+        'counselor_columns': bulk_import.PROFILE_COLUMNS['counselor'],
+    }
+    return render(request, 'import_users.html', context)
+
+
+def _calendar_feed_version(request, token):
+    """Look the feed up once per request for the condition() callbacks and the view"""
+    if not hasattr(request, 'calendar_feed'):
+        request.calendar_feed = CalendarFeedToken.objects.select_related(
+            'user').filter(token=token).first()
+        request.calendar_feed_version = (
+            ical.feed_version(request.calendar_feed.user)
+            if request.calendar_feed else (None, None))
+    return request.calendar_feed_version
+
+
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request, token: _calendar_feed_version(request, token)[1],
+    last_modified_func=lambda request, token: _calendar_feed_version(request, token)[0],
+)
+def calendar_feed(request, token):
+    """iCalendar feed of a user's sessions, authenticated by the secret token"""
+    _calendar_feed_version(request, token)
+    if request.calendar_feed is None:
+        raise Http404("Unknown calendar feed")
+
+    response = StreamingHttpResponse(
+        ical.render_feed(request.calendar_feed.user, request.get_host()),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'inline; filename="protisruti.ics"'
+    return response
+
+
+@login_required
+def calendar_settings(request):
+    """Show the user's calendar feed URL and allow revoking it"""
+    if request.method == 'POST':
+        ical.get_feed_token(request.user, regenerate=True)
+        messages.success(
+            request, "A new calendar link was created. The old link no longer works.")
+        return redirect('calendar_settings')
+
+    feed = ical.get_feed_token(request.user)
+    feed_url = request.build_absolute_uri(reverse('calendar_feed', args=[feed.token]))
+    context = {
+        'feed_url': feed_url,
+        'webcal_url': 'webcal://' + feed_url.split('://', 1)[1],
+    }
+    return render(request, 'calendar_settings.html', context)
+
+
 @login_required
 def victim_assignments(request):
     # Fetch assignments for the logged-in victim
-    assignments = request.user.assignments.all()
+    assignments = CounselorAssignment.objects.filter(
+        user=request.user
+    ).select_related('counselor__counselor_profile').order_by('-assigned_date')
     return render(request, 'victim_assignments.html', {'assignments': assignments})
 
 
 @login_required
 def counselor_assignments(request):
     # Fetch assignments for the logged-in counselor
-    assignments = request.user.counselor_profile.assignments.all()
+    assignments = CounselorAssignment.objects.filter(
+        counselor=request.user
+    ).select_related('user__user_profile').order_by('-assigned_date')
     return render(request, 'counselor_assignments.html', {'assignments': assignments})
 
 
 @login_required
-def chat_view(request, receiver_email):
-    receiver = get_object_or_404(User, email=receiver_email)
-    messages = Message.objects.filter(
-        (models.Q(sender=request.user) & models.Q(receiver=receiver)) |
-        (models.Q(sender=receiver) & models.Q(receiver=request.user))
-    ).order_by('timestamp')
+def chat_view(request, assignment_id):
+    """Conversation between the two participants of an assignment"""
+    participants = assignments.assignment_participants(assignment_id)
+    if participants is None:
+        raise Http404("No such conversation")
+    receiver_id = assignments.other_participant(participants, request.user.pk)
+    if receiver_id is None:
+        raise PermissionDenied
+
+    form = MessageForm()
+    if request.method == 'POST':
+        form = MessageForm(request.POST)
+        if not participants.active:
+            messages.error(request, "This assignment is no longer active.")
+            return redirect('chat_view', assignment_id=assignment_id)
+        if form.is_valid():
+            messaging.send_message(request.user, receiver_id, form.cleaned_data['content'],
+                                   form.cleaned_data['client_id'])
+            return redirect('chat_view', assignment_id=assignment_id)
+
+    receiver = User.objects.select_related(
+        'user_profile', 'counselor_profile').get(pk=receiver_id)
+    history = conversation_history(request.user, receiver, limit=CHAT_HISTORY_LIMIT)
+    context = {
+        'assignment_id': assignment_id,
+        'receiver': receiver,
+        'chat_messages': history,
+        'seen_message_id': messaging.update_receipts(
+            assignment_id, request.user.pk, receiver_id, history),
+        'form': form,
+        'can_send': participants.active,
+    }
+    return render(request, 'chat.html', context)
+
+
+@login_required
+def chat_status(request, assignment_id):
+    """
+    Polled by the chat page. GET ?seen=<id> advances the caller's read mark,
+    POST flags the caller as typing; both answer with the partner's read
+    mark and typing state. Everything is normally served from the cache.
+    """
+    participants = assignments.assignment_participants(assignment_id)
+    if participants is None:
+        raise Http404("No such conversation")
+    partner_id = assignments.other_participant(participants, request.user.pk)
+    if partner_id is None:
+        raise PermissionDenied
 
     if request.method == 'POST':
-        content = request.POST.get('content')
-        if content:
-            Message.objects.create(sender=request.user,
-                                   receiver=receiver, content=content)
-            return redirect('chat', receiver_email=receiver.email)
+        messaging.set_typing(assignment_id, request.user.pk)
+    else:
+        seen = request.GET.get('seen', '')
+        if seen.isdigit():
+            # Nobody can have seen past the partner's newest message
+            seen = min(int(seen), messaging.newest_message_id(partner_id, request.user.pk))
+            if seen:
+                messaging.mark_read(assignment_id, request.user.pk, seen)
+
+    return JsonResponse({
+        'read_up_to': messaging.read_mark(assignment_id, partner_id),
+        'typing': messaging.is_typing(assignment_id, partner_id),
+    })
+
+
+@login_required
+def chat_redirect(request, receiver_email):
+    """Old email address of a conversation; redirects to the assignment's chat"""
+    receiver = get_object_or_404(User, email=receiver_email)
+    if receiver.pk not in assignments.chat_partner_ids(request.user):
+        raise PermissionDenied
+    assignment_id = CounselorAssignment.objects.filter(
+        Q(user=request.user, counselor=receiver) | Q(user=receiver, counselor=request.user),
+        status='active',
+    ).values_list('pk', flat=True).first()
+    if assignment_id is None:
+        raise Http404("No such conversation")
+    return redirect('chat_view', assignment_id=assignment_id)
+
+
+@login_required
+def search_view(request):
+    """Search the messages and session notes the logged in user takes part in"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
 
-    return render(request, 'chat.html', {'receiver': receiver, 'messages': messages})
+    results = search.search(request.user, query, page=page, per_page=SEARCH_PAGE_SIZE) if query else []
+
+    context = {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': len(results) == SEARCH_PAGE_SIZE,
+    }
+    return render(request, 'search.html', context)
+
+
+@functools.lru_cache(maxsize=1)
+def _hashed_static_names():
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def serve_static(request, path):
+    """
+    Serve collected static files, preferring precompressed brotli/gzip
+    variants. Hashed files get far-future, immutable cache headers.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if name in accept_encoding and os.path.isfile(full_path + suffix):
+            full_path += suffix
+            encoding = name
+            break
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if path in _hashed_static_names():
+        response.headers['Cache-Control'] = (
+            f'public, max-age={settings.STATIC_MAX_AGE}, immutable')
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
@@ -0,0 +1,105 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    CounselingSession,
+    CounselorAssignment,
+    CounselorAvailability,
+    CounselorStats,
+)
+
+STAT_FIELDS = ('active_assignments', 'upcoming_sessions',
+               'completed_sessions', 'weekly_available_minutes')
+
+
+def slot_minutes(start_time, end_time):
+    return (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+
+
+def compute_counselor_stats(counselor_id):
+    """Aggregate the workload numbers of one counselor from the source tables"""
+    sessions = CounselingSession.objects.filter(assignment__counselor_id=counselor_id)
+    slots = CounselorAvailability.objects.filter(
+        counselor_id=counselor_id, is_available=True
+    ).values_list('start_time', 'end_time')
+    return {
+        'active_assignments': CounselorAssignment.objects.filter(
+            counselor_id=counselor_id, status='active').count(),
+        'upcoming_sessions': sessions.filter(
+            status='scheduled', scheduled_time__gte=timezone.now()).count(),
+        'completed_sessions': sessions.filter(status='completed').count(),
+        'weekly_available_minutes': sum(slot_minutes(start, end) for start, end in slots),
+    }
+
+
+def refresh_counselor_stats(counselor_id):
+    stats, _ = CounselorStats.objects.update_or_create(
+        counselor_id=counselor_id, defaults=compute_counselor_stats(counselor_id))
+    return stats
+
+
+def apply_stats_delta(counselor_id, **deltas):
+    """
+    Add deltas to a counselor's stats row with a single UPDATE. The first
+    change for a counselor without a row computes it from scratch instead.
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not counselor_id or not deltas:
+        return
+    updated = CounselorStats.objects.filter(counselor_id=counselor_id).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + value for field, value in deltas.items()},
+    )
+    if not updated:
+        refresh_counselor_stats(counselor_id)
+
+
+def get_stats_for(counselor_ids):
+    """Stats rows keyed by counselor id, with zeroed rows for missing ones"""
+    stats = CounselorStats.objects.in_bulk(counselor_ids)
+    return {
+        counselor_id: stats.get(counselor_id) or CounselorStats(counselor_id=counselor_id)
+        for counselor_id in counselor_ids
+    }
+
+
+def reconcile_all_stats():
+    """
+    Recompute every counselor's stats with one grouped query per source
+    table and write them back in bulk. Returns the number of rows written.
+    """
+    from django.db.models import Count
+
+    from .models import User
+
+    counselor_ids = list(User.objects.filter(user_type='counselor').values_list('pk', flat=True))
+    computed = {pk: dict.fromkeys(STAT_FIELDS, 0) for pk in counselor_ids}
+
+    def merge(field, rows):
+        for counselor_id, value in rows:
+            if counselor_id in computed:
+                computed[counselor_id][field] = value
+
+    merge('active_assignments', CounselorAssignment.objects.filter(status='active')
+          .values_list('counselor_id').annotate(n=Count('id')).order_by())
+    sessions = CounselingSession.objects.values_list('assignment__counselor_id')
+    merge('upcoming_sessions', sessions.filter(
+        status='scheduled', scheduled_time__gte=timezone.now()
+    ).annotate(n=Count('id')).order_by())
+    merge('completed_sessions', sessions.filter(status='completed')
+          .annotate(n=Count('id')).order_by())
+
+    for counselor_id, start, end in CounselorAvailability.objects.filter(
+            is_available=True).values_list('counselor_id', 'start_time', 'end_time'):
+        if counselor_id in computed:
+            computed[counselor_id]['weekly_available_minutes'] += slot_minutes(start, end)
+
+    rows = [CounselorStats(counselor_id=pk, updated_at=timezone.now(), **values)
+            for pk, values in computed.items()]
+    CounselorStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['counselor'],
+        update_fields=list(STAT_FIELDS) + ['updated_at'],
+    )
+    return len(rows)
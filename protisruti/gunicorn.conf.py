@@ -0,0 +1,25 @@
+"""
+Gunicorn settings: `gunicorn -c gunicorn.conf.py` from this directory.
+
+The app is imported once in the master before the workers are forked
+(preload_app), so new workers start without importing Django, the models
+or the views again and share those pages copy-on-write.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'protisruti.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+max_requests = 2000
+max_requests_jitter = 200
+raw_env = ['DJANGO_SETTINGS_MODULE=' + os.environ.get(
+    'DJANGO_SETTINGS_MODULE', 'protisruti.settings_production')]
+
+
+def post_fork(server, worker):
+    # Connections opened in the master while preloading must not be shared
+    from django.db import connections
+    connections.close_all()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.TimezoneMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,6 +73,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'protisruti.wsgi.application'
 
+# Route read-heavy pages to core.async_views (enabled by protisruti/asgi.py)
+ASYNC_VIEWS = os.environ.get('PROTISRUTI_ASYNC_VIEWS') == '1'
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
@@ -87,6 +93,101 @@ DATABASES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Stream uploads straight to disk and hash them while they arrive
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.HashingFileUploadHandler',
+]
+UPLOAD_WORKER_THREADS = 2
+
+# Offload protected media delivery to the web server.
+# 'nginx' -> X-Accel-Redirect to SENDFILE_URL (an `internal` location aliased
+# to MEDIA_ROOT), 'apache' -> X-Sendfile, None -> served by Django.
+SENDFILE_BACKEND = None
+SENDFILE_URL = '/protected-media/'
+
+# Messages older than this are moved to core_archivedmessage by
+# `python manage.py archive_messages`
+MESSAGE_ARCHIVE_AFTER_DAYS = 90
+MESSAGE_ARCHIVE_BATCH_SIZE = 1000
+
+# Compression for CompressedTextField columns (message content, notes).
+# 'zstd' needs the zstandard package. To use a shared zlib dictionary add it
+# to COMPRESSED_TEXT_DICTIONARIES and set COMPRESSED_TEXT_DICTIONARY_ID; never
+# remove a dictionary that rows may still reference.
+COMPRESSED_TEXT_CODEC = 'zlib'
+COMPRESSED_TEXT_LEVEL = 6
+COMPRESSED_TEXT_MIN_LENGTH = 64
+COMPRESSED_TEXT_DICTIONARIES = {}
+COMPRESSED_TEXT_DICTIONARY_ID = None
+
+# Bulk CSV import of users and counselors (core.bulk_import). Passwords are
+# hashed in a process pool; None uses one worker per CPU.
+IMPORT_BATCH_SIZE = 500
+IMPORT_HASH_WORKERS = None
+
+# Recurring session series are created as CounselingSession rows this many
+# weeks ahead; `python manage.py materialize_sessions` (daily) extends them.
+SESSION_SERIES_WINDOW_WEEKS = 8
+
+# Weekly availability is projected onto UTC windows this many weeks ahead in
+# each counselor's time zone; `python manage.py refresh_availability_windows`
+# (daily) rolls the projection forward.
+AVAILABILITY_PROJECTION_WEEKS = 12
+
+# Token bucket throttling of abuse-prone POSTs (core.ratelimit), keyed by URL
+# name. Each scope maps to (capacity, seconds to refill the whole bucket):
+# 'ip' per client address, 'account' per targeted or logged in account,
+# 'conversation' per sender and chat partner. The 'memory' store is per
+# process; 'sqlite' shares buckets between the worker processes of a host.
+RATELIMIT_ENABLED = True
+RATELIMIT_STORE = 'memory'
+RATELIMIT_SQLITE_PATH = BASE_DIR / 'ratelimit.sqlite3'
+# Share of requests checked against a rule that also drop refilled buckets
+RATELIMIT_PURGE_PROBABILITY = 0.001
+RATELIMIT_TRUST_FORWARDED_FOR = False
+RATELIMIT_RULES = {
+    'login': {'ip': (20, 60), 'account': (5, 300)},
+    'register_user': {'ip': (5, 3600), 'account': (3, 3600)},
+    'register_counselor': {'ip': (5, 3600), 'account': (3, 3600)},
+    'chat_view': {'account': (30, 60), 'conversation': (10, 60)},
+    'api_sync': {'account': (30, 60)},
+}
+
+# Cache for the assignment graph (core.assignments). The local memory cache
+# is per process, so ASSIGNMENT_GRAPH_CACHE_TIMEOUT bounds how long another
+# worker can see a stale entry; production shares a file cache instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+ASSIGNMENT_GRAPH_CACHE_TIMEOUT = 300
+
+# Chat read receipts are cached and written to ConversationReadState at most
+# once per interval (seconds); typing indicators expire after CHAT_TYPING_TTL.
+CHAT_READ_STATE_WRITE_INTERVAL = 30
+CHAT_TYPING_TTL = 5
+
+# Notification digests (core.digests, `manage.py send_digests`). A recipient
+# gets at most one digest per DIGEST_INTERVAL seconds, covering unread
+# messages older than DIGEST_MESSAGE_DELAY seconds and scheduled sessions in
+# the next DIGEST_SESSION_WINDOW_HOURS.
+DIGEST_INTERVAL = 60 * 60
+DIGEST_MESSAGE_DELAY = 15 * 60
+DIGEST_MAX_MESSAGE_AGE_DAYS = 7
+DIGEST_SESSION_WINDOW_HOURS = 24
+DIGEST_BATCH_SIZE = 500
+SITE_URL = 'http://localhost:8000'
+
+# Mail goes to a local debugging server during development:
+# `python manage.py smtp_debug_server` prints every message it receives.
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = 'localhost'
+EMAIL_PORT = 1025
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = 'Protisruti <no-reply@protisruti.local>'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,6 +230,10 @@ STATICFILES_DIRS = [
 
 STATIC_URL = 'static/'
 
+# See settings_production.py for the cached, precompressed production profile
+SERVE_STATIC = False
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,69 @@
+"""
+Production settings for protisruti.
+
+Select with DJANGO_SETTINGS_MODULE=protisruti.settings_production.
+Run `python manage.py collectstatic` on deploy to build the hashed,
+precompressed static manifest.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)  # noqa: F405
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
+
+# Compile each template once per process instead of on every render
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Compress responses and answer If-None-Match/If-Modified-Since with 304s
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+] + MIDDLEWARE[1:]
+
+# Gunicorn runs several worker processes; share the rate limit buckets
+RATELIMIT_STORE = os.environ.get('DJANGO_RATELIMIT_STORE', 'sqlite')
+RATELIMIT_TRUST_FORWARDED_FOR = os.environ.get('DJANGO_TRUST_FORWARDED_FOR') == '1'
+
+# One cache for all worker processes, so invalidations reach every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+}
+
+SITE_URL = os.environ.get('DJANGO_SITE_URL', 'http://localhost')
+
+EMAIL_HOST = os.environ.get('DJANGO_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('DJANGO_EMAIL_PORT', '587'))
+EMAIL_HOST_USER = os.environ.get('DJANGO_EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('DJANGO_EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('DJANGO_EMAIL_USE_TLS', '1') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', DEFAULT_FROM_EMAIL)  # noqa: F405
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Hashed static files never change, so they can be cached for a year.
+# Set SERVE_STATIC when no front-end server handles STATIC_URL.
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+SERVE_STATIC = os.environ.get('DJANGO_SERVE_STATIC') == '1'
@@ -15,17 +15,25 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
-# For media files in development
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # core goes first so its admin/... pages aren't swallowed by the admin
+    # site's catch-all view
     path('', include('core.urls')),  # Include the core app URLs
+    path('admin/', admin.site.urls),
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# MEDIA_ROOT only holds verification documents; they are never served
+# directly, not even in development, but through the permission-checked
+# verification_document view
+
+# Serve collected static files with far-future cache headers when there is
+# no front-end server in front of Django
+if settings.SERVE_STATIC:
+    from core.views import serve_static
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
\ No newline at end of file
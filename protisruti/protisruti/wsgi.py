@@ -10,7 +10,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'protisruti.settings')
 
 application = get_wsgi_application()
+
+# Load the URLconf (and with it every view, form and admin module) now
+# instead of on the first request. Under `gunicorn --preload` this happens
+# once in the master and the forked workers share the loaded modules.
+get_resolver().url_patterns